@@ -453,41 +453,51 @@ class ReliableRouterNode:
     # === 定时任务 (Hello/DV) ===
     def _task_hello(self):
         while self.running:
-            packet = f"{TYPE_HELLO}{SEPARATOR}{self.my_id}"
-            for port in list(self.active_ports.keys()): 
-                self._send_to_port(port, packet)
+            self._send_hello_once()
             time.sleep(HELLO_INTERVAL)
 
     def _task_broadcast_dv(self):
         while self.running:
-            dv_snapshot = {}
-            with self.rt_lock:
-                for dest, info in self.routing_table.items():
-                    dv_snapshot[dest] = {'cost': info['cost']}
-            dv_str = json.dumps(dv_snapshot)
-            packet = f"{TYPE_DV}{SEPARATOR}{self.my_id}{SEPARATOR}{dv_str}"
-            for port in list(self.active_ports.keys()):
-                self._send_to_port(port, packet)
+            self._broadcast_dv_once()
             time.sleep(DV_INTERVAL)
 
     def _task_check_timeout(self):
         while self.running:
-            now = time.time()
-            timeout_ports = []
-            with self.neighbors_lock:
-                for port, info in self.neighbors.items():
-                    if now - info['last_seen'] > NEIGHBOR_TIMEOUT:
-                        print(f"[连接断开] 邻居 {info['id']} ({port}) 超时")
-                        timeout_ports.append(port)
-                for p in timeout_ports:
-                    del self.neighbors[p]
-            if timeout_ports:
-                with self.rt_lock:
-                    for dest, info in self.routing_table.items():
-                        if info['next_hop_port'] in timeout_ports and dest != self.my_id:
-                            info['cost'] = 999
+            self._check_timeout_once()
             time.sleep(1)
 
+    # 单次执行的任务体，供上面的循环 (或外部调度器) 调用
+    def _send_hello_once(self):
+        packet = f"{TYPE_HELLO}{SEPARATOR}{self.my_id}"
+        for port in list(self.active_ports.keys()): 
+            self._send_to_port(port, packet)
+
+    def _broadcast_dv_once(self):
+        dv_snapshot = {}
+        with self.rt_lock:
+            for dest, info in self.routing_table.items():
+                dv_snapshot[dest] = {'cost': info['cost']}
+        dv_str = json.dumps(dv_snapshot)
+        packet = f"{TYPE_DV}{SEPARATOR}{self.my_id}{SEPARATOR}{dv_str}"
+        for port in list(self.active_ports.keys()):
+            self._send_to_port(port, packet)
+
+    def _check_timeout_once(self):
+        now = time.time()
+        timeout_ports = []
+        with self.neighbors_lock:
+            for port, info in self.neighbors.items():
+                if now - info['last_seen'] > NEIGHBOR_TIMEOUT:
+                    print(f"[连接断开] 邻居 {info['id']} ({port}) 超时")
+                    timeout_ports.append(port)
+            for p in timeout_ports:
+                del self.neighbors[p]
+        if timeout_ports:
+            with self.rt_lock:
+                for dest, info in self.routing_table.items():
+                    if info['next_hop_port'] in timeout_ports and dest != self.my_id:
+                        info['cost'] = 999
+
     # === UI ===
     def _input_loop(self):
         while self.running:
@@ -31,7 +31,7 @@ class SerialClient:
         # 使用 utils 的 debug 也可以，但这里格式比较特殊，保留原样但用 print
         print(f"[DEBUG {ts}] {direction}: len={len(payload)} raw={raw} hex={hex_str}")
     
-    def open_port(self, port_name, baudrate=9600, bytesize=8, stopbits=1, parity='N'):
+    def open_port(self, port_name, baudrate=115200, bytesize=8, stopbits=1, parity='N'):
         """打开串口"""
         self.ser = create_serial_connection(port_name, baudrate, 1, bytesize, stopbits, parity)
         if self.ser:
@@ -108,8 +108,8 @@ def main():
     # 2. 设置波特率
     while True:
         try:
-            bps_input = input("请输入波特率 (默认9600): ").strip()
-            baudrate = int(bps_input) if bps_input else 9600
+            bps_input = input("请输入波特率 (默认115200): ").strip()
+            baudrate = int(bps_input) if bps_input else 115200
             break
         except ValueError:
             Logger.error("请输入有效的波特率")
@@ -30,10 +30,13 @@ class SerialServer:
         hex_str = ' '.join(f"{b:02X}" for b in payload)
         print(f"[DEBUG {ts}] {direction}: len={len(payload)} raw={raw} hex={hex_str}")
     
-    def open_port(self, port_name, baudrate=9600, bytesize=8, stopbits=1, parity='N'):
+    def open_port(self, port_name, baudrate=115200, bytesize=8, stopbits=1, parity='N'):
         """打开串口"""
         self.ser = create_serial_connection(port_name, baudrate, 1, bytesize, stopbits, parity)
         if self.ser:
+            # Windows 下加大驱动收发缓冲区，减少高波特率下的溢出和系统调用次数
+            if sys.platform.startswith('win'):
+                self.ser.set_buffer_size(rx_size=8192, tx_size=4096)
             Logger.success(f"服务器串口 {port_name} 打开成功")
             return True
         else:
@@ -55,7 +58,8 @@ class SerialServer:
                 if isinstance(data, str):
                     data = data.encode('utf-8')
                 self.ser.write(data)
-                self._log('SEND', data)
+                if self.debug:
+                    self._log('SEND', data)
                 return True
             except Exception as e:
                 Logger.error(f"发送失败: {e}")
@@ -99,7 +103,8 @@ class SerialServer:
                 if self.ser.in_waiting > 0:
                     data = self.ser.readline()
                     if data:
-                        self._log('RECV', data)
+                        if self.debug:
+                            self._log('RECV', data)
                         
                         # 处理请求并返回响应
                         response, should_quit = self.process_request(data)
@@ -145,8 +150,8 @@ def main():
     # 2. 设置波特率
     while True:
         try:
-            bps_input = input("请输入波特率 (默认9600): ").strip()
-            baudrate = int(bps_input) if bps_input else 9600
+            bps_input = input("请输入波特率 (默认115200): ").strip()
+            baudrate = int(bps_input) if bps_input else 115200
             break
         except ValueError:
             Logger.error("请输入有效的波特率")
@@ -14,7 +14,7 @@ import os
 
 # 导入 utils
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils import Logger, select_serial_port, create_serial_connection
+from utils import Logger, select_serial_port, create_serial_connection, read_commands
 
 # 数据帧分隔符
 SEPARATOR = '|'
@@ -60,11 +60,12 @@ class LeafNode:
         处理接收到的帧
         格式: SRC_ID|DST_ID|PAYLOAD
         """
-        parts = raw_data.split(SEPARATOR, 2)
-        if len(parts) != 3:
+        src_id, sep, rest = raw_data.partition(SEPARATOR)
+        if not sep:
+            return
+        dst_id, sep, payload = rest.partition(SEPARATOR)
+        if not sep:
             return
-
-        src_id, dst_id, payload = parts
 
         if dst_id == self.my_id:
             print(f"\n[收到消息] 来自 {src_id}: {payload}")
@@ -125,8 +126,7 @@ def main():
     print("="*60)
 
     try:
-        while True:
-            cmd = input("> ").strip()
+        for cmd in read_commands("> "):
             if not cmd:
                 continue
                 
@@ -15,10 +15,12 @@ import os
 
 # 导入 utils
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils import Logger, select_serial_port, create_serial_connection
+from utils import Logger, QueuedLogger, ForwardSummary, select_serial_port, create_serial_connection
 
 # 数据帧分隔符
 SEPARATOR = '|'
+# 转发日志汇总间隔(秒)
+REPORT_INTERVAL = 1
 
 class PortListener(threading.Thread):
     def __init__(self, port, baudrate, callback, user_id="Unknown"):
@@ -29,6 +31,9 @@ class PortListener(threading.Thread):
         self.user_id = user_id # 该端口连接的设备ID
         self.ser = None
         self.running = False
+        # 复用的发送缓冲区；多个端口线程可能同时向本端口转发，需加锁
+        self._tx_buf = bytearray(1024)
+        self._tx_lock = threading.Lock()
 
     def run(self):
         try:
@@ -55,7 +60,15 @@ class PortListener(threading.Thread):
     def send(self, data):
         if self.ser and self.ser.is_open:
             try:
-                self.ser.write((data + '\n').encode('utf-8'))
+                raw = data.encode('utf-8') if isinstance(data, str) else data
+                n = len(raw)
+                with self._tx_lock:
+                    if len(self._tx_buf) < n + 1:
+                        self._tx_buf = bytearray(n + 1)
+                    buf = self._tx_buf
+                    buf[:n] = raw
+                    buf[n] = 0x0A # '\n'
+                    self.ser.write(memoryview(buf)[:n + 1])
                 return True
             except Exception as e:
                 Logger.error(f"[{self.port}] 发送失败: {e}")
@@ -72,23 +85,25 @@ class RootNode:
         self.routing_table = {} # node_id -> port_name
         self.my_id = "ROOT"
 
+        # 逐帧日志走异步队列，转发计数按秒汇总输出
+        self.log = QueuedLogger()
+        self._fwd = ForwardSummary(self.log, "[转发] {0} 帧 (最近: {1} -> {2} : {3} -> {4})", REPORT_INTERVAL)
+
     def handle_message(self, raw_data, source_port):
         """
         处理接收到的消息
         协议格式: SRC_ID|DST_ID|PAYLOAD
         """
-        parts = raw_data.split(SEPARATOR, 2)
-        if len(parts) != 3:
-            Logger.debug(f"[收到畸形帧] {raw_data} 来自 {source_port}")
+        src_id, sep, rest = raw_data.partition(SEPARATOR)
+        if sep:
+            dst_id, sep, payload = rest.partition(SEPARATOR)
+        if not sep:
+            self.log.debug(f"[收到畸形帧] {raw_data} 来自 {source_port}")
             return
 
-        src_id, dst_id, payload = parts
-        
-        # 显示接收日志
-        print(f"[RECV] {src_id} -> {dst_id} : {payload} (来自 {source_port})")
-
         # 判断是否发给自己
         if dst_id == self.my_id:
+            print(f"[RECV] {src_id} -> {dst_id} : {payload} (来自 {source_port})")
             print(f"  >>> 收到发给自己的消息: {payload}")
             return
 
@@ -98,18 +113,19 @@ class RootNode:
             
             # 避免回环（虽然逻辑上查表不会查回原端口，除非路由表配置错误）
             if target_port == source_port:
-                Logger.warning(f"  [警告] 目标端口与源端口相同，丢弃")
+                self.log.warning(f"  [警告] 目标端口与源端口相同，丢弃")
                 return
 
             if target_port in self.listeners:
-                print(f"  >>> 转发至端口 {target_port} (目标: {dst_id})")
                 success = self.listeners[target_port].send(raw_data)
-                if not success:
-                    Logger.error(f"  [ERROR] 转发失败")
+                if success:
+                    self._fwd.add(src_id, dst_id, source_port, target_port)
+                else:
+                    self.log.error(f"  [ERROR] 转发失败")
             else:
-                Logger.error(f"  [ERROR] 目标端口 {target_port} 未在监听列表")
+                self.log.error(f"  [ERROR] 目标端口 {target_port} 未在监听列表")
         else:
-            Logger.warning(f"  [丢弃] 未知目标ID: {dst_id} (转发表中不存在)")
+            self.log.warning(f"  [丢弃] 未知目标ID: {dst_id} (转发表中不存在)")
 
     def add_port(self, port, baudrate, connected_id):
         if port in self.listeners:
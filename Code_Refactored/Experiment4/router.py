@@ -10,12 +10,25 @@
 import threading
 import time
 import json
+import heapq
+from collections import namedtuple
 import sys
 import os
 
 # 导入 utils
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils import Logger, select_multiple_ports, create_serial_connection
+from utils import Logger, QueuedLogger, ForwardSummary, select_multiple_ports, create_serial_connection, read_commands
+
+# DV 编解码: 优先使用 orjson (Rust 实现，直接输出 bytes)，未安装时回退到标准库 json
+try:
+    import orjson
+    _json_loads = orjson.loads
+    def _json_dumps_b(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps_b(obj):
+        return json.dumps(obj).encode('utf-8')
 
 # === 协议常量 ===
 TYPE_HELLO = 'HELLO' # 邻居发现
@@ -28,6 +41,10 @@ SEPARATOR  = '|'     # 字段分隔符
 HELLO_INTERVAL = 3   # 发送Hello包的间隔(秒)
 DV_INTERVAL    = 5   # 发送路由表的间隔(秒)
 NEIGHBOR_TIMEOUT = 10 # 邻居超时判定(秒)
+FWD_REPORT_INTERVAL = 1 # 转发日志汇总间隔(秒)
+
+# 路由表条目 (不可变)，更新时整体替换，快照只需浅拷贝字典
+RtEntry = namedtuple('RtEntry', 'cost next_hop_port next_hop_id')
 
 class RouterNode:
     def __init__(self):
@@ -39,18 +56,28 @@ class RouterNode:
         self.active_ports = {}
         # port_locks: port_name -> threading.Lock (用于互斥写入)
         self.port_locks = {}
+        # _tx_bufs: port_name -> bytearray (复用的发送缓冲区，受 port_locks 保护)
+        self._tx_bufs = {}
         
         # 邻居表
         # neighbors: port_name -> {'id': neighbor_id, 'last_seen': timestamp}
         self.neighbors = {} 
         self.neighbors_lock = threading.Lock()
+        # 邻居到期时间最小堆: (deadline, port_name, seq)，受 neighbors_lock 保护
+        # 每次收到 Hello 都压入新条目并递增该端口的 seq，旧条目出堆时因 seq 不匹配被忽略
+        self._nbr_heap = []
+        self._nbr_seq = {}
 
         # 路由表 (Distance Vector)
-        # 结构: dest_id -> {'cost': int, 'next_hop_port': port_name, 'next_hop_id': id}
-        # 初始时包含自己: {my_id: {'cost': 0, 'next_hop_port': 'LOCAL', 'next_hop_id': my_id}}
+        # 结构: dest_id -> RtEntry(cost, next_hop_port, next_hop_id)
+        # 初始时包含自己: {my_id: RtEntry(0, 'LOCAL', my_id)}
         self.routing_table = {}
         self.rt_lock = threading.Lock()
 
+        # 热路径日志 (转发/丢弃/解析错误) 走异步队列，转发日志按秒汇总
+        self.log = QueuedLogger()
+        self._fwd = ForwardSummary(self.log, "[转发] {0} 个包 (最近: {1}->{2} via {3})", FWD_REPORT_INTERVAL)
+
     def start(self):
         print("="*60)
         print("实验四：动态路由 (DV算法)")
@@ -69,7 +96,7 @@ class RouterNode:
             self.my_id = input("请输入本机ID (例如 A, B, PC1): ").strip()
         
         # 初始化路由表（加入自己）
-        self.routing_table[self.my_id] = {'cost': 0, 'next_hop_port': 'LOCAL', 'next_hop_id': self.my_id}
+        self.routing_table[self.my_id] = RtEntry(0, 'LOCAL', self.my_id)
 
         self.running = True
         
@@ -80,6 +107,7 @@ class RouterNode:
             if ser:
                 self.active_ports[port] = ser
                 self.port_locks[port] = threading.Lock()
+                self._tx_bufs[port] = bytearray(1024)
                 
                 t = threading.Thread(target=self._listen_port, args=(port,), daemon=True)
                 t.start()
@@ -123,17 +151,23 @@ class RouterNode:
             pass
 
     def _send_to_port(self, port_name, packet_str):
-        """线程安全地发送数据"""
+        """线程安全地发送数据 (复用端口发送缓冲区，避免每包拼接新对象)"""
         if port_name not in self.active_ports:
             return False
         
         lock = self.port_locks[port_name]
         ser = self.active_ports[port_name]
+        data = packet_str.encode('utf-8') if isinstance(packet_str, str) else packet_str
+        n = len(data)
         
         with lock:
             try:
-                data = (packet_str + '\n').encode('utf-8')
-                ser.write(data)
+                buf = self._tx_bufs[port_name]
+                if len(buf) < n + 1:
+                    buf = self._tx_bufs[port_name] = bytearray(n + 1)
+                buf[:n] = data
+                buf[n] = 0x0A # '\n'
+                ser.write(memoryview(buf)[:n + 1])
                 return True
             except Exception as e:
                 Logger.error(f"[{port_name}] 发送错误: {e}")
@@ -150,49 +184,49 @@ class RouterNode:
         3. DATA|SrcID|DstID|Payload
         """
         try:
-            parts = raw_data.split(SEPARATOR, 3) # 最多切分出前几个字段
-            if len(parts) < 2: return
-            
-            p_type = parts[0]
+            # 先切出类型字段，再按类型逐段 partition (返回三元组，无需构造列表)
+            p_type, sep, rest = raw_data.partition(SEPARATOR)
+            if not sep: return
             
             if p_type == TYPE_HELLO:
-                sender_id = parts[1]
+                sender_id = rest.partition(SEPARATOR)[0]
                 self._on_recv_hello(sender_id, port_source)
                 
             elif p_type == TYPE_DV:
                 # DV|SenderID|JSON
-                if len(parts) < 3: return
-                sender_id = parts[1]
-                dv_json = parts[2]
+                sender_id, sep, dv_json = rest.partition(SEPARATOR)
+                if not sep: return
                 self._on_recv_dv(sender_id, dv_json, port_source)
                 
             elif p_type == TYPE_DATA:
                 # DATA|SrcID|DstID|Payload
-                if len(parts) != 4: return
-                _, src_id, dst_id, payload = parts
+                src_id, sep, rest = rest.partition(SEPARATOR)
+                if not sep: return
+                dst_id, sep, payload = rest.partition(SEPARATOR)
+                if not sep: return
                 self._on_recv_data(src_id, dst_id, payload)
                 
         except Exception as e:
-            Logger.debug(f"[Packet Error] {e} | Raw: {raw_data}")
+            self.log.debug(f"[Packet Error] {e} | Raw: {raw_data}")
 
     def _on_recv_hello(self, sender_id, port):
         """收到Hello包，更新邻居状态"""
         with self.neighbors_lock:
             # 记录或更新邻居
-            self.neighbors[port] = {'id': sender_id, 'last_seen': time.time()}
+            now = time.time()
+            self.neighbors[port] = {'id': sender_id, 'last_seen': now}
+            seq = self._nbr_seq.get(port, 0) + 1
+            self._nbr_seq[port] = seq
+            heapq.heappush(self._nbr_heap, (now + NEIGHBOR_TIMEOUT, port, seq))
             
             # 如果邻居不在路由表中（或者路由表中该邻居是不可达状态），立即标记为直连
             with self.rt_lock:
                 # 直连邻居 Distance = 1
                 current_entry = self.routing_table.get(sender_id)
                 # 如果没有路由，或者现有路由开销大于1（说明之前绕路了），则更新为直连
-                if not current_entry or current_entry['cost'] > 1:
+                if not current_entry or current_entry.cost > 1:
                     # print(f"[拓扑变动] 发现直连邻居: {sender_id} via {port}")
-                    self.routing_table[sender_id] = {
-                        'cost': 1, 
-                        'next_hop_port': port,
-                        'next_hop_id': sender_id
-                    }
+                    self.routing_table[sender_id] = RtEntry(1, port, sender_id)
 
     def _on_recv_dv(self, sender_id, dv_json, port):
         """
@@ -200,66 +234,49 @@ class RouterNode:
         优化：增加 Triggered Update 机制
         """
         try:
-            neighbor_dv = json.loads(dv_json)
+            neighbor_dv = _json_loads(dv_json)
         except:
             return
 
+        my_id = self.my_id
+        table = self.routing_table
+
         with self.rt_lock:
             updated = False
             
             # 1. 遍历邻居通告的所有目的地
+            # 下一跳就是该邻居 -> 直接采用新开销；否则仅在新开销更小时切换下一跳
             for dest, info in neighbor_dv.items():
-                if dest == self.my_id: continue # 忽略去往自己的路由通告
+                if dest == my_id: continue # 忽略去往自己的路由通告
                 
-                # 邻居到目标的开销
-                cost_neighbor_to_dest = info.get('cost', 999)
                 # 经由该邻居到达目标的总开销 = 1 (我到邻居) + cost (邻居到目标)
-                new_cost = 1 + cost_neighbor_to_dest
-                if new_cost > 999: new_cost = 999
+                cand = 1 + info.get('cost', 999)
+                if cand > 999: cand = 999
                 
-                current_route = self.routing_table.get(dest)
+                current_route = table.get(dest)
                 
-                # 情况A: 发现新目标 (且不是不可达)
-                if not current_route:
-                    if new_cost < 999:
-                        self.routing_table[dest] = {
-                            'cost': new_cost,
-                            'next_hop_port': port,
-                            'next_hop_id': sender_id
-                        }
+                if current_route is None:
+                    # 情况A: 发现新目标 (且不是不可达)
+                    if cand < 999:
+                        table[dest] = RtEntry(cand, port, sender_id)
                         updated = True
-                
-                # 情况B: 现有路由的下一跳就是该邻居
-                elif current_route['next_hop_id'] == sender_id:
-                    # 如果原先是可达的，现在变不可达(999)，或者cost变化
-                    if current_route['cost'] != new_cost:
-                        current_route['cost'] = new_cost
+                elif current_route.next_hop_id == sender_id:
+                    # 情况B: 现有路由的下一跳就是该邻居，开销随之变化
+                    if current_route.cost != cand:
+                        table[dest] = current_route._replace(cost=cand)
                         updated = True
+                elif cand < current_route.cost:
+                    # 情况C: 该邻居提供了更短路径
+                    table[dest] = RtEntry(cand, port, sender_id)
+                    updated = True
 
-                # 情况C: 现有路由下一跳不是这个邻居，但这个邻居提供了更短路径
-                elif new_cost < current_route['cost']:
-                    self.routing_table[dest] = {
-                        'cost': new_cost,
-                        'next_hop_port': port,
-                        'next_hop_id': sender_id
-                    }
+            # 2. 检查是否有路由需要毒化 (下一跳是该邻居，但通告里已没有该目的地)
+            for dest, route in table.items():
+                if route.next_hop_id == sender_id and route.cost != 999 \
+                        and dest != my_id and dest not in neighbor_dv:
+                    table[dest] = route._replace(cost=999)
                     updated = True
 
-            # 2. 检查是否有路由需要毒化 
-            for dest in list(self.routing_table.keys()):
-                if dest == self.my_id: continue
-                route = self.routing_table[dest]
-                if route['next_hop_id'] == sender_id:
-                    # 如果邻居通告里没有这个 destination
-                    if dest not in neighbor_dv:
-                        # 视为不可达
-                        if route['cost'] != 999:
-                            route['cost'] = 999
-                            updated = True
-
-            # if updated: 
-                # 这里可以触发 Triggered Update
-        
         if updated:
             self._send_dv_updates()
 
@@ -267,10 +284,11 @@ class RouterNode:
         """发送路由更新（支持毒性逆转 Poison Reverse）"""
         # 1. 准备快照
         with self.rt_lock:
-            # 复制一份当前路由表用于计算
-            snapshot = {k:v.copy() for k,v in self.routing_table.items()}
+            # 条目不可变，浅拷贝即可得到一致快照
+            snapshot = self.routing_table.copy()
         
         current_ports = list(self.active_ports.keys())
+        dv_prefix = f"{TYPE_DV}{SEPARATOR}{self.my_id}{SEPARATOR}".encode('utf-8')
         
         for port_out in current_ports:
             # 找出这个端口连接的邻居ID
@@ -282,18 +300,16 @@ class RouterNode:
             # 构建针对该端口的DV
             custom_dv = {}
             for dest, info in snapshot.items():
-                cost = info['cost']
+                cost = info.cost
                 
                 # 毒性逆转逻辑
-                if info.get('next_hop_port') == port_out:
+                if info.next_hop_port == port_out:
                     cost = 999 
                 
                 custom_dv[dest] = {'cost': cost}
             
             # 发送
-            dv_str = json.dumps(custom_dv)
-            packet = f"{TYPE_DV}{SEPARATOR}{self.my_id}{SEPARATOR}{dv_str}"
-            self._send_to_port(port_out, packet)
+            self._send_to_port(port_out, dv_prefix + _json_dumps_b(custom_dv))
 
     def _on_recv_data(self, src_id, dst_id, payload):
         """收到数据包"""
@@ -305,14 +321,14 @@ class RouterNode:
         # 转发逻辑
         with self.rt_lock:
             route = self.routing_table.get(dst_id)
-            if route and route['cost'] < 999:
-                next_port = route['next_hop_port']
+            if route and route.cost < 999:
+                next_port = route.next_hop_port
                 # 封装并转发
                 packet = f"{TYPE_DATA}{SEPARATOR}{src_id}{SEPARATOR}{dst_id}{SEPARATOR}{payload}"
-                Logger.info(f"[转发] {src_id}->{dst_id} via {next_port}")
                 self._send_to_port(next_port, packet)
+                self._fwd.add(src_id, dst_id, next_port)
             else:
-                 Logger.warning(f"[丢弃] 目标不可达: {dst_id} (From {src_id})")
+                 self.log.warning(f"[丢弃] 目标不可达: {dst_id} (From {src_id})")
 
     # === 定时任务 ===
 
@@ -332,64 +348,67 @@ class RouterNode:
             time.sleep(DV_INTERVAL)
 
     def _task_check_timeout(self):
-        """检测邻居超时"""
+        """检测邻居超时 (按最早到期时间休眠，而不是每秒扫描全部邻居)"""
         while self.running:
             now = time.time()
             timeout_ports = []
             
             with self.neighbors_lock:
-                for port, info in self.neighbors.items():
-                    if now - info['last_seen'] > NEIGHBOR_TIMEOUT:
+                heap = self._nbr_heap
+                while heap and heap[0][0] <= now:
+                    _, port, seq = heapq.heappop(heap)
+                    # 过期条目：该端口之后又收到过 Hello
+                    if self._nbr_seq.get(port) != seq:
+                        continue
+                    del self._nbr_seq[port]
+                    info = self.neighbors.pop(port, None)
+                    if info:
                         Logger.warning(f"[连接断开] 邻居 {info['id']} ({port}) 超时")
                         timeout_ports.append(port)
-                
-                # 清除超时邻居
-                for p in timeout_ports:
-                    del self.neighbors[p]
+                delay = heap[0][0] - now if heap else 1
             
             if timeout_ports:
                 # 触发路由表更新
                 with self.rt_lock:
                     for dest, info in self.routing_table.items():
-                        if info['next_hop_port'] in timeout_ports and dest != self.my_id:
-                            info['cost'] = 999 
+                        if info.next_hop_port in timeout_ports and dest != self.my_id:
+                            self.routing_table[dest] = info._replace(cost=999)
             
-            time.sleep(1)
+            time.sleep(max(0, delay))
 
     # === 用户交互 ===
     def _input_loop(self):
-        while self.running:
-            try:
-                cmd = input("> ").strip()
+        try:
+            for cmd in read_commands("> ", lambda: self.running):
                 if not cmd: continue
-                
-                parts = cmd.split()
-                op = parts[0].lower()
-                
-                if op == 'table' or op == 't':
-                    self._print_table()
-                elif op == 'send' or op == 's':
-                    # send ID Hello World
-                    if len(parts) < 3:
-                        print("用法: send <目标ID> <消息内容>")
-                        continue
-                    target = parts[1]
-                    msg = " ".join(parts[2:])
-                    self._initiate_send(target, msg)
-                elif op == 'exit' or op == 'quit':
-                    self.running = False
-                    print("正在退出...")
-                    for s in self.active_ports.values():
-                        s.close()
-                    sys.exit(0)
-                else:
-                    print("未知命令。可用: table, send, exit")
+                try:
+                    parts = cmd.split()
+                    op = parts[0].lower()
                     
-            except KeyboardInterrupt:
-                self.running = False
-                sys.exit(0)
-            except Exception as e:
-                Logger.error(f"输入错误: {e}")
+                    if op == 'table' or op == 't':
+                        self._print_table()
+                    elif op == 'send' or op == 's':
+                        # send ID Hello World
+                        if len(parts) < 3:
+                            print("用法: send <目标ID> <消息内容>")
+                            continue
+                        target = parts[1]
+                        msg = " ".join(parts[2:])
+                        self._initiate_send(target, msg)
+                    elif op == 'exit' or op == 'quit':
+                        self.running = False
+                        print("正在退出...")
+                        for s in self.active_ports.values():
+                            s.close()
+                        sys.exit(0)
+                    else:
+                        print("未知命令。可用: table, send, exit")
+                        
+                except Exception as e:
+                    Logger.error(f"输入错误: {e}")
+        except KeyboardInterrupt:
+            self.running = False
+            sys.exit(0)
 
     def _print_table(self):
         print("\n------- 当前路由表 (Distance Vector) -------")
@@ -397,7 +416,7 @@ class RouterNode:
         print("-" * 55)
         with self.rt_lock:
             for dest, info in self.routing_table.items():
-                print(f"{dest:<15} {info['cost']:<10} {info['next_hop_id']:<15} {info['next_hop_port']:<10}")
+                print(f"{dest:<15} {info.cost:<10} {info.next_hop_id:<15} {info.next_hop_port:<10}")
         print("-" * 55)
 
     def _initiate_send(self, target_id, msg):
@@ -411,12 +430,12 @@ class RouterNode:
             if not route:
                 Logger.warning(f"错误: 找不到去往 {target_id} 的路由")
                 return
-            if route['cost'] >= 999:
+            if route.cost >= 999:
                 Logger.warning(f"错误: 目标 {target_id} 当前不可达")
                 return
             
-            port = route['next_hop_port']
-            Logger.info(f"[发送] 目标:{target_id} 下一跳:{route['next_hop_id']} ({port})")
+            port = route.next_hop_port
+            Logger.info(f"[发送] 目标:{target_id} 下一跳:{route.next_hop_id} ({port})")
             self._send_to_port(port, packet)
 
 if __name__ == '__main__':
@@ -20,16 +20,52 @@ import sys
 import zlib
 import random
 import os
+import functools
+import queue
+import selectors
+import concurrent.futures
+from collections import deque, OrderedDict
 
 # 导入 utils
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils import Logger, select_multiple_ports, create_serial_connection
 
+# 校验码实现: 优先使用 fastcrc (硬件加速, x86 上基于 PCLMULQDQ 折叠)
+# 与 zlib.crc32 同为 CRC-32/ISO-HDLC，结果完全一致，未安装时回退到 zlib
+try:
+    from fastcrc import crc32 as _fastcrc32
+    _crc32 = _fastcrc32.iso_hdlc
+except ImportError:
+    _crc32 = zlib.crc32
+
+# 可选: CRC-32C (Castagnoli)，由 crc32c 包提供，使用 SSE4.2 / ARMv8 CRC32 指令
+try:
+    from crc32c import crc32c as _crc32c
+except ImportError:
+    _crc32c = None
+
+# JSON 格式 DV 的编解码: 优先使用 orjson，未安装时回退到标准库 json
+try:
+    import orjson
+    def _json_dumps_b(obj):
+        return orjson.dumps(obj)
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps_b(obj):
+        return json.dumps(obj).encode('utf-8')
+    _json_loads = json.loads
+
 # === 协议常量 ===
 TYPE_HELLO = 'HELLO'
 TYPE_DV    = 'DV'
 TYPE_DATA  = 'DATA'  # 网络层数据包类型
 SEPARATOR  = '|'
+SEP_B      = SEPARATOR.encode('ascii')
+
+# 接收端直接在 bytes 上解析，类型字段按 bytes 比较
+TYPE_HELLO_B = TYPE_HELLO.encode('ascii')
+TYPE_DV_B    = TYPE_DV.encode('ascii')
+TYPE_DATA_B  = TYPE_DATA.encode('ascii')
 
 # 运输层常量
 TRANS_TYPE_DATA = 'DAT'
@@ -37,37 +73,92 @@ TRANS_TYPE_ACK  = 'ACK'
 TRANS_TYPE_SYN  = 'SYN' # 类似TCP SYN，用于建立新会话并同步序列号
 TRANS_TYPE_SYNACK = 'SAK' # SYN-ACK
 
+# 运输层类型的 ASCII 编码 (计算校验码时直接使用，无需每帧重新编码)
+TRANS_TYPE_B = {t: t.encode('ascii') for t in (TRANS_TYPE_DATA, TRANS_TYPE_ACK, TRANS_TYPE_SYN, TRANS_TYPE_SYNACK)}
+
+# 序号 -> ASCII bytes 查找表 (初始序号取自 0..65535)，免去每帧的 int->str->bytes 转换
+_SEQ_BYTES = tuple(str(i).encode('ascii') for i in range(65536))
+
+def _seq_bytes(seq):
+    if 0 <= seq < 65536:
+        return _SEQ_BYTES[seq]
+    return b'%d' % seq
+
+# 字典查找的"不存在"标记，与任何合法值 (包括 None 和整数) 都不相同
+_MISSING = object()
+
+@functools.lru_cache(maxsize=256)
+def _id_bytes(node_id):
+    """节点ID -> UTF-8 编码 (缓存)。网络中节点ID数量很少，校验和转发时不必每帧重新编码"""
+    return node_id.encode('utf-8')
+
 # 配置
 # BAUDRATE = 9600
 HELLO_INTERVAL = 3
 DV_INTERVAL    = 5
 NEIGHBOR_TIMEOUT = 10
-TIMEOUT_RETRANSMIT = 3.0 # 超时重传时间(秒)
-MAX_RETRIES = 30         # 最大重传次数
+TIMEOUT_RETRANSMIT = 3.0 # 首次超时重传时间(秒)，之后按 RETRANSMIT_BACKOFF 指数退避
+RETRANSMIT_BACKOFF = 1.5 # 每次重传后超时时间的增长倍数
+MAX_RETRANSMIT_DELAY = 30.0 # 超时时间上限(秒)
+MAX_RETRIES = 8          # 最大重传次数
+MAX_SEQ_PEERS = 256      # expected_seqs 最多保留的对端数量 (LRU 淘汰)
+MAX_CORRUPT_COUNT = 100  # corrupt <次数> 允许的最大值
+READ_TIMEOUT = 1.0       # 串口阻塞读超时(秒)
+
+# 本机发送时使用的校验算法: 'crc32' (默认，所有节点都支持) 或 'crc32c' (需安装 crc32c)
+# CRC-32C 校验码在帧中带 'C' 前缀，接收端按前缀选择算法，因此两种节点可以混用
+CHECKSUM_ALGO = 'crc32'
+CHK_TAG_CRC32C = 'C'
+CHK_TAG_CRC32C_B = CHK_TAG_CRC32C.encode('ascii')
+
+# 本机发送 DV 的格式: 'compact' (默认) 或 'json' (与旧版节点互通时使用)
+# compact: Dest:Cost;Dest:Cost;...   json: {"Dest": {"cost": Cost}, ...}
+# 接收端按首字节 '{' 自动识别，两种格式都能解析
+DV_FORMAT = 'compact'
+DV_ENTRY_SEP = ';'
+DV_COST_SEP  = ':'
+if CHECKSUM_ALGO == 'crc32c' and _crc32c is None:
+    CHECKSUM_ALGO = 'crc32'
 
 class ReliableRouterNode:
     def __init__(self):
         self.my_id = ""
+        self._my_id_b = b""           # my_id 的编码缓存，在 start() 确定ID后设置
+        self._data_prefix = b""       # 本机发出的 DATA 包前缀 b"DATA|<my_id>|"，同上
         self.running = False
         
         self.active_ports = {}
-        self.port_locks = {}
+        self.write_queues = {}        # 每个端口一个发送队列，由对应的写线程合并后一次写出
+        self._rx_buffers = {}         # _rx_loop 使用: 每个端口尚未凑成整行的接收数据
+        # 邻居表与路由表均为写时复制 (copy-on-write):
+        # 写者在写锁内复制一份、修改后整体替换引用；读者直接读当前引用，无需加锁。
+        # 表项 dict 一旦发布就不再原地修改，需要改动时替换为新 dict。
         self.neighbors = {} 
-        self.neighbors_lock = threading.Lock()
+        self._nbr_write_lock = threading.Lock()
 
         # 路由表
         self.routing_table = {}
-        self.rt_lock = threading.Lock()
+        self._rt_write_lock = threading.Lock()
+        # 已序列化的 DV 包缓存，路由表变化时置脏，由 _task_broadcast_dv 重建
+        self._dv_cache_bytes = None
+        self._dv_dirty = True
 
         # === 实验五新增状态 ===
-        self.seq_num = 0              # 发送序号 (简单的递增整数)
-        self.expected_seqs = {}       # 接收端状态: {SrcID: NextExpectedSeq}
-        self.ack_event = threading.Event() # 用于等待ACK
-        self.received_ack_seq = -1    # 收到的ACK序号
+        self.expected_seqs = OrderedDict()  # 接收端状态: {SrcID: NextExpectedSeq}，按最近使用排序
+        # 接收线程与超时检查线程都会修改 expected_seqs (含 LRU 重排)，统一经 _seq_lock 访问
+        self._seq_lock = threading.Lock()
+        # 发送端状态: {(DstID, Seq): Future}，每个在途发送各自等待自己的ACK，
+        # 因此发往不同目标 (或并发) 的可靠发送互不干扰
+        self.pending_acks = {}
+        self.pending_lock = threading.Lock()
+        # 可靠发送在后台线程中执行 (重传期间可能阻塞很久)，命令行可继续输入
+        self._send_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='reliable-send')
         
-        self.simulate_error = False   # 模拟校验错误开关
-        self.corruption_count = 0     # 剩余干扰次数
-        self.simulate_loss = False    # 模拟丢包开关
+        # 故障模拟: 由命令行线程设置、发送线程消耗。
+        # 校验错误为计数器 (由 _corrupt_lock 保护)；丢包最多一次，用 deque (append/popleft 原子)
+        self._corrupt_left = 0        # 剩余的模拟校验错误次数
+        self._corrupt_lock = threading.Lock()
+        self._loss_q = deque()        # 剩余的模拟丢包次数
 
     def start(self):
         print("="*60)
@@ -83,21 +174,32 @@ class ReliableRouterNode:
         # 2. 本机ID
         while not self.my_id:
             self.my_id = input("请输入本机ID (例如 A, B, PC1): ").strip()
+        self._my_id_b = _id_bytes(self.my_id)
+        self._data_prefix = TYPE_DATA_B + SEP_B + self._my_id_b + SEP_B
 
         # Init Routing Table
-        self.routing_table[self.my_id] = {'cost': 0, 'next_hop_port': 'LOCAL', 'next_hop_id': self.my_id}
+        self.routing_table = {self.my_id: {'cost': 0, 'next_hop_port': 'LOCAL', 'next_hop_id': self.my_id}}
 
         self.running = True
         
         # Start Listeners
+        # POSIX 下所有串口注册到同一个 selector，由单个 _rx_loop 线程接收；
+        # Windows 的串口句柄不支持 select，仍为每个端口启动一个 _listen_port 线程
+        use_selector = not sys.platform.startswith('win')
+        sel = selectors.DefaultSelector() if use_selector else None
         for port in target_ports:
-            ser = create_serial_connection(port, timeout=0.1)
+            # 读超时只用于定期检查 running 标志，收到完整一行会立即返回
+            ser = create_serial_connection(port, timeout=READ_TIMEOUT)
             if ser:
                 self.active_ports[port] = ser
-                self.port_locks[port] = threading.Lock()
+                self.write_queues[port] = queue.SimpleQueue()
                 
-                t = threading.Thread(target=self._listen_port, args=(port,), daemon=True)
-                t.start()
+                if use_selector:
+                    sel.register(ser, selectors.EVENT_READ, data=port)
+                    self._rx_buffers[port] = b""
+                else:
+                    threading.Thread(target=self._listen_port, args=(port,), daemon=True).start()
+                threading.Thread(target=self._writer_loop, args=(port,), daemon=True).start()
                 Logger.info(f"[{port}] 监听已启动...")
             else:
                 Logger.error(f"[{port}] 打开失败")
@@ -105,6 +207,8 @@ class ReliableRouterNode:
         if not self.active_ports:
             Logger.error("无可用端口，退出")
             return
+        if use_selector:
+            threading.Thread(target=self._rx_loop, args=(sel,), daemon=True).start()
 
         # Start Background Tasks
         threading.Thread(target=self._task_hello, daemon=True).start()
@@ -118,32 +222,75 @@ class ReliableRouterNode:
         
         self._input_loop()
 
+    def _rx_loop(self, sel):
+        """单线程接收所有串口 (selector 多路复用)，按行切分后直接交给 _handle_packet"""
+        while self.running:
+            for key, _ in sel.select(timeout=READ_TIMEOUT):
+                ser, port_name = key.fileobj, key.data
+                try:
+                    data = ser.read(ser.in_waiting or 1)
+                except Exception as e:
+                    Logger.error(f"[{port_name}] 读取错误: {e}")
+                    sel.unregister(ser)
+                    continue
+                buf = self._rx_buffers[port_name] + data
+                while b'\n' in buf:
+                    line, _, buf = buf.partition(b'\n')
+                    line = line.strip()
+                    if line:
+                        self._handle_packet(line, port_name)
+                self._rx_buffers[port_name] = buf
+        sel.close()
+
     def _listen_port(self, port_name):
+        """单端口接收线程 (Windows 下使用)"""
         ser = self.active_ports[port_name]
+        pending = b""  # 超时返回的半行，等下次读到行尾后拼接
         while self.running and ser.is_open:
             try:
-                if ser.in_waiting:
-                    line = ser.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        self._handle_packet(line, port_name)
-                else:
-                    time.sleep(0.01)
+                # 阻塞在系统调用上等待数据，不再轮询 in_waiting + sleep
+                chunk = ser.read_until(b'\n')
+                if not chunk:
+                    continue
+                if not chunk.endswith(b'\n'):
+                    pending += chunk
+                    continue
+                # 保持 bytes，由 _handle_packet 只解码需要的 ID 字段
+                line = (pending + chunk).strip() if pending else chunk.strip()
+                pending = b""
+                if line:
+                    self._handle_packet(line, port_name)
             except Exception as e:
                 Logger.error(f"[{port_name}] 读取错误: {e}")
                 break
 
+    def _writer_loop(self, port_name):
+        """端口写线程：取出队列中所有待发帧，拼接后一次 write()，减少系统调用和USB传输次数"""
+        ser = self.active_ports[port_name]
+        q = self.write_queues[port_name]
+        while self.running and ser.is_open:
+            try:
+                chunks = [q.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    chunks.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                ser.write(b''.join(chunks))
+            except Exception as e:
+                Logger.error(f"[{port_name}] 发送错误: {e}")
+
     def _send_to_port(self, port_name, packet_str):
+        """放入端口发送队列 (SimpleQueue 本身线程安全，无需加锁)，实际写出由 _writer_loop 完成"""
         if port_name not in self.active_ports:
             return False
         
-        with self.port_locks[port_name]:
-            try:
-                data = (packet_str + '\n').encode('utf-8')
-                self.active_ports[port_name].write(data)
-                return True
-            except Exception as e:
-                Logger.error(f"[{port_name}] 发送错误: {e}")
-                return False
+        data = packet_str.encode('utf-8') if isinstance(packet_str, str) else packet_str
+        self.write_queues[port_name].put(data + b'\n')
+        return True
     
     def _send_to_port_with_simulation(self, port_name, packet_str):
         """支持模拟的发送（仅用于可靠消息）"""
@@ -151,68 +298,98 @@ class ReliableRouterNode:
             return False
         
         # 模拟丢包（仅在可靠传输时）
-        if self.simulate_loss:
-            Logger.warning(f"[Simulate] 模拟丢包 (本应发往 {port_name})")
-            self.simulate_loss = False  # 只模拟一次
-            return True  # 返回True表示"发送"了，但实际没有
+        if self._loss_q:
+            try:
+                self._loss_q.popleft()  # 只模拟一次
+            except IndexError:
+                pass  # 已被其他线程取走
+            else:
+                Logger.warning(f"[Simulate] 模拟丢包 (本应发往 {port_name})")
+                return True  # 返回True表示"发送"了，但实际没有
         
         return self._send_to_port(port_name, packet_str)
 
     def _handle_packet(self, raw_data, port_source):
+        """raw_data 为串口读到的一行 bytes (已去掉行尾)"""
         try:
-            parts = raw_data.split(SEPARATOR, 3) 
+            parts = raw_data.split(SEP_B, 3) 
             if len(parts) < 2: return
             
             p_type = parts[0]
             
-            if p_type == TYPE_HELLO:
-                sender_id = parts[1]
+            if p_type == TYPE_HELLO_B:
+                sender_id = parts[1].decode('utf-8', errors='ignore')
                 self._on_recv_hello(sender_id, port_source)
                 
-            elif p_type == TYPE_DV:
+            elif p_type == TYPE_DV_B:
                 if len(parts) < 3: return
-                sender_id = parts[1]
-                dv_json = parts[2]
-                self._on_recv_dv(sender_id, dv_json, port_source)
+                sender_id = parts[1].decode('utf-8', errors='ignore')
+                self._on_recv_dv(sender_id, parts[2], port_source)
                 
-            elif p_type == TYPE_DATA:
-                # DATA|SrcID|DstID|Payload(TransportFrame)
+            elif p_type == TYPE_DATA_B:
+                # DATA|SrcID|DstID|Payload(TransportFrame)，Payload 保持 bytes
                 if len(parts) != 4: return
-                _, src_id, dst_id, payload = parts
-                self._on_recv_data(src_id, dst_id, payload)
+                _, src_b, dst_b, payload = parts
+                self._on_recv_data(src_b.decode('utf-8', errors='ignore'),
+                                   dst_b.decode('utf-8', errors='ignore'), payload, raw_data)
                 
         except Exception as e:
             Logger.debug(f"[Packet Error] {e} | Raw: {raw_data}")
 
     # === 路由协议处理 (Exp 3/4) ===
     def _on_recv_hello(self, sender_id, port):
-        with self.neighbors_lock:
-            self.neighbors[port] = {'id': sender_id, 'last_seen': time.time()}
-            with self.rt_lock:
-                current_entry = self.routing_table.get(sender_id)
-                if not current_entry or current_entry['cost'] > 1:
-                    self.routing_table[sender_id] = {
-                        'cost': 1, 
-                        'next_hop_port': port,
-                        'next_hop_id': sender_id
-                    }
-
-    def _on_recv_dv(self, sender_id, dv_json, port):
+        with self._nbr_write_lock:
+            new_nbrs = dict(self.neighbors)
+            new_nbrs[port] = {'id': sender_id, 'last_seen': time.time()}
+            self.neighbors = new_nbrs
+        
+        current_entry = self.routing_table.get(sender_id)
+        if current_entry and current_entry['cost'] <= 1:
+            return  # 常见情况: 路由已是直连，无需进入写锁
+        with self._rt_write_lock:
+            current_entry = self.routing_table.get(sender_id)
+            if not current_entry or current_entry['cost'] > 1:
+                new_tbl = dict(self.routing_table)
+                new_tbl[sender_id] = {
+                    'cost': 1, 
+                    'next_hop_port': port,
+                    'next_hop_id': sender_id
+                }
+                self.routing_table = new_tbl
+                self._dv_dirty = True
+
+    def _encode_dv(self, dv_snapshot):
+        """{Dest: Cost} -> DV 负载 bytes"""
+        if DV_FORMAT == 'json':
+            return _json_dumps_b({dest: {'cost': cost} for dest, cost in dv_snapshot.items()})
+        return DV_ENTRY_SEP.join(f"{dest}{DV_COST_SEP}{cost}" for dest, cost in dv_snapshot.items()).encode('utf-8')
+
+    def _decode_dv(self, payload):
+        """DV 负载 bytes -> [(Dest, Cost)]，兼容旧版 JSON 格式"""
+        if payload.startswith(b'{'):
+            return [(dest, info.get('cost', 999)) for dest, info in _json_loads(payload).items()]
+        entries = []
+        for item in payload.decode('utf-8').split(DV_ENTRY_SEP):
+            dest, _, cost = item.rpartition(DV_COST_SEP)
+            entries.append((dest, int(cost)))
+        return entries
+
+    def _on_recv_dv(self, sender_id, dv_payload, port):
         try:
-            neighbor_dv = json.loads(dv_json)
-        except:
+            neighbor_dv = self._decode_dv(dv_payload)
+        except Exception:
             return
 
-        with self.rt_lock:
+        with self._rt_write_lock:
+            new_tbl = dict(self.routing_table)
             updated = False
-            for dest, info in neighbor_dv.items():
+            for dest, cost_neighbor_to_dest in neighbor_dv:
                 if dest == self.my_id: continue
-                cost_neighbor_to_dest = info.get('cost', 999)
                 new_cost = 1 + cost_neighbor_to_dest
-                current_route = self.routing_table.get(dest)
+                current_route = new_tbl.get(dest)
                 
                 if not current_route:
-                    self.routing_table[dest] = {
+                    new_tbl[dest] = {
                         'cost': new_cost,
                         'next_hop_port': port,
                         'next_hop_id': sender_id
@@ -220,36 +397,62 @@ class ReliableRouterNode:
                     updated = True
                 elif current_route['next_hop_id'] == sender_id:
                     if current_route['cost'] != new_cost:
-                        current_route['cost'] = new_cost
+                        new_tbl[dest] = dict(current_route, cost=new_cost)
                         updated = True
                 elif new_cost < current_route['cost']:
-                    self.routing_table[dest] = {
+                    new_tbl[dest] = {
                         'cost': new_cost,
                         'next_hop_port': port,
                         'next_hop_id': sender_id
                     }
                     updated = True
+            if updated:
+                self.routing_table = new_tbl
+                self._dv_dirty = True
 
     # === 可靠传输处理 (Exp 5) ===
     
-    def _calculate_checksum(self, src, dst, seq, t_type, body):
-        """计算校验码 (CRC32)"""
+    def _calculate_checksum(self, src_b, dst_b, seq, t_type_b, body_b, algo=None):
+        """
+        计算校验码 (默认 CRC32，algo='crc32c' 时使用 CRC-32C)
+        除 seq 外各字段均为已编码的 bytes，由调用方缓存复用
+        """
+        crc = _crc32c if (algo or CHECKSUM_ALGO) == 'crc32c' else _crc32
         # 伪首部 + 数据
         # Src|Dst|Seq|Type|Body
-        content = f"{src}{SEPARATOR}{dst}{SEPARATOR}{seq}{SEPARATOR}{t_type}{SEPARATOR}{body}"
-        return zlib.crc32(content.encode('utf-8')) & 0xffffffff
+        # 逐字段链式计算 (上一段结果作为初值)，不再拼接出整段内容
+        c = crc(src_b)
+        c = crc(SEP_B, c)
+        c = crc(dst_b, c)
+        c = crc(SEP_B, c)
+        c = crc(_seq_bytes(seq), c)
+        c = crc(SEP_B, c)
+        c = crc(t_type_b, c)
+        c = crc(SEP_B, c)
+        c = crc(body_b, c)
+        return c & 0xffffffff
+
+    def _format_checksum(self, chk):
+        """生成帧中的校验码字段 (CRC-32C 带前缀标记)"""
+        if CHECKSUM_ALGO == 'crc32c':
+            return f"{CHK_TAG_CRC32C}{chk}"
+        return str(chk)
+
+    def _build_data_packet(self, target_b, seq, chk, t_type_b, body_b):
+        """网络层包 DATA|Me|Target| + 运输层帧 0|0|Seq|Chk|Type|Body，直接用预编码的 bytes 一次拼接"""
+        return SEP_B.join((self._data_prefix + target_b, b'0', b'0', _seq_bytes(seq),
+                           self._format_checksum(chk).encode('ascii'), t_type_b, body_b))
 
     def _transport_send_ack(self, target_id, seq_ack, is_syn_ack=False):
         """发送ACK (或 SYN-ACK) 帧"""
         # 决定类型
         t_type = TRANS_TYPE_SYNACK if is_syn_ack else TRANS_TYPE_ACK
         # Frame: SrcPort(0)|DstPort(0)|Seq(AckNum)|Checksum|Type|Payload("")
-        chk = self._calculate_checksum(self.my_id, target_id, seq_ack, t_type, "")
+        target_b = _id_bytes(target_id)
+        t_type_b = TRANS_TYPE_B[t_type]
+        chk = self._calculate_checksum(self._my_id_b, target_b, seq_ack, t_type_b, b"")
         
-        # Transport Frame Str
-        tf_str = f"0{SEPARATOR}0{SEPARATOR}{seq_ack}{SEPARATOR}{chk}{SEPARATOR}{t_type}{SEPARATOR}"
-        # Encap in Network Packet
-        packet = f"{TYPE_DATA}{SEPARATOR}{self.my_id}{SEPARATOR}{target_id}{SEPARATOR}{tf_str}"
+        packet = self._build_data_packet(target_b, seq_ack, chk, t_type_b, b"")
         
         # 路由发送
         # Logger.debug(f"[Transport] Sending {t_type} Seq={seq_ack} to {target_id}...")
@@ -259,86 +462,84 @@ class ReliableRouterNode:
              pass 
              # Logger.debug(f"[Transport] Sent {t_type} {seq_ack} to {target_id} Success")
 
-    def _on_recv_data(self, src_id, dst_id, payload):
+    def _get_expected_seq(self, src_id, default=None):
+        with self._seq_lock:
+            seq = self.expected_seqs.get(src_id, _MISSING)
+            if seq is _MISSING:
+                return default
+            self.expected_seqs.move_to_end(src_id)
+            return seq
+
+    def _set_expected_seq(self, src_id, seq):
+        with self._seq_lock:
+            self.expected_seqs[src_id] = seq
+            self.expected_seqs.move_to_end(src_id)
+            if len(self.expected_seqs) > MAX_SEQ_PEERS:
+                self.expected_seqs.popitem(last=False)  # 淘汰最久未通信的对端
+
+    def _drop_expected_seq(self, src_id):
+        with self._seq_lock:
+            self.expected_seqs.pop(src_id, None)
+
+    def _on_recv_data(self, src_id, dst_id, payload, raw_data):
         """
-        处理网络层数据包
+        处理网络层数据包 (payload 为运输层帧的原始 bytes，raw_data 为收到的整个包)
         如果是发给我的 -> 交给运输层处理
-        如果不是 -> 转发
+        如果不是 -> 原样转发 raw_data
         """
         if dst_id == self.my_id:
             # 传输层解封装
             try:
-                t_parts = payload.split(SEPARATOR, 5)
+                t_parts = payload.split(SEP_B, 5)
                 if len(t_parts) < 6:
                     Logger.error(f"收到格式错误的运输层帧: {payload}")
                     return
                 
-                src_port, dst_port, seq_str, chk_str, t_type, body = t_parts
-                seq = int(seq_str)
-                recv_chk = int(chk_str)
+                src_port, dst_port, seq_b, chk_b, t_type_b, body_b = t_parts
+                seq = int(seq_b)
+                if chk_b.startswith(CHK_TAG_CRC32C_B):
+                    if _crc32c is None:
+                        Logger.warning(f"[RX Error] 来自{src_id}的帧使用 CRC-32C 校验，本机未安装 crc32c - 丢弃")
+                        return
+                    algo = 'crc32c'
+                    recv_chk = int(chk_b[len(CHK_TAG_CRC32C_B):])
+                else:
+                    algo = 'crc32'
+                    recv_chk = int(chk_b)
                 
-                # 1. 校验
-                cal_chk = self._calculate_checksum(src_id, dst_id, seq, t_type, body)
+                # 1. 校验 (直接对收到的 bytes 计算)
+                cal_chk = self._calculate_checksum(_id_bytes(src_id), self._my_id_b, seq,
+                                                   t_type_b, body_b, algo)
                 if recv_chk != cal_chk:
                     Logger.warning(f"[RX Error] 校验失败! 来自{src_id} Seq={seq} (Recv:{recv_chk} vs Calc:{cal_chk}) - 丢弃")
                     # 校验失败，不发送ACK（等待发送方超时重传）
                     return 
                 
-                # 2. 处理 Type
+                # 2. 处理 Type (校验通过后才解码)
+                t_type = t_type_b.decode('ascii', errors='ignore')
+                body = body_b.decode('utf-8', errors='ignore')
                 if t_type == TRANS_TYPE_SYN or t_type == TRANS_TYPE_DATA:
                     is_syn = (t_type == TRANS_TYPE_SYN)
                     if is_syn:
                         Logger.info(f"[RX SYN] 新会话请求 来自{src_id} InitSeq={seq}: {body}")
-                        self.expected_seqs[src_id] = seq + 1  # 同步序列号，期望下一个
-                        # 检查是否重复或失序
-                        expected = self.expected_seqs.get(src_id, seq)
-                        if seq == expected: # Logic check: seq was just updated above to seq+1 so expected is seq+1? No.
-                            # Re-read logic:
-                            # Original: self.expected_seqs[src_id] = seq + 1 
-                            # Then expected = get ...
-                            # If I set it to seq+1, then next time I expect seq+1.
-                            # But wait, logic in original code:
-                            # self.expected_seqs[src_id] = seq + 1
-                            # expected = self.expected_seqs.get(src_id, seq) -- this gets seq+1
-                            # if seq == expected: -- seq == seq+1 False.
-                            # There is a flaw in original code or my reading of it.
-                            
-                            # Let's check original code carefully.
-                            # line 365: self.expected_seqs[src_id] = seq + 1
-                            # line 367: expected = self.expected_seqs.get(src_id, seq)
-                            # NO, line 365 is inside if is_syn block. 
-                            # Actually, original code logic seems to update expected_seq AFTER confirm?
-                            # Line 365 in original read file: `self.expected_seqs[src_id] = seq + 1`
-                            # Wait, in the original snippet I read:
-                            # is_syn clause:
-                            #   print...
-                            #   self.expected_seqs[src_id] = seq + 1
-                            #   expected = self.expected_seqs.get(...) -- This would act weirdly if I just set it.
-                            
-                            # Let's fix the logic here to be sound.
-                            # Proper logic: Check if seq is what we expect.
-                            # However, for SYN, we reset expectation usually.
-                            
-                            # Simplified assumption derived from original code intent:
-                            # 1. Accept SYN. 2. Send SYN-ACK.
-                            if body:
-                                Logger.info(f"    >>> [交付应用层] {body}")
-                            self._transport_send_ack(src_id, seq, is_syn_ack=True)
-                            self.expected_seqs[src_id] = seq + 1
-
-                        # Original code had complex check regarding expected vs seq but updated expected right before it?
-                        # I will simply accept SYN and update expected.
+                        # 重传的 SYN (SYN-ACK 丢失) 不重复交付，但仍需再次应答
+                        if self._get_expected_seq(src_id) == seq + 1:
+                            Logger.warning(f"    [重复SYN] Seq={seq}. 仍发送SYN-ACK.")
+                        elif body:
+                            Logger.info(f"    >>> [交付应用层] {body}")
+                        self._transport_send_ack(src_id, seq, is_syn_ack=True)
+                        self._set_expected_seq(src_id, seq + 1)  # 同步序列号，期望下一个
 
                     else:
                         # 普通数据包
                         Logger.info(f"[RX] 收到数据 来自{src_id} Seq={seq}: {body}")
-                        expected = self.expected_seqs.get(src_id, seq) # default to seq if not found?
+                        expected = self._get_expected_seq(src_id, seq) # default to seq if not found?
                         
                         if seq == expected:
                             self._transport_send_ack(src_id, seq, is_syn_ack=False)
                             if body: 
                                 Logger.info(f"    >>> [交付应用层] {body}")
-                            self.expected_seqs[src_id] = seq + 1
+                            self._set_expected_seq(src_id, seq + 1)
                         elif seq < expected:
                             Logger.warning(f"    [重复帧] Seq={seq}, 期望={expected}. 发送ACK.")
                             self._transport_send_ack(src_id, seq, is_syn_ack=False)
@@ -348,133 +549,178 @@ class ReliableRouterNode:
                 elif t_type == TRANS_TYPE_ACK or t_type == TRANS_TYPE_SYNACK:
                     # 收到ACK或SYN-ACK
                     Logger.info(f"[RX] 收到 {t_type} 来自{src_id} AckSeq={seq}")
-                    if seq == self.seq_num: 
-                        self.received_ack_seq = seq
-                        self.ack_event.set()
+                    with self.pending_lock:
+                        fut = self.pending_acks.pop((src_id, seq), None)
+                    if fut:
+                        fut.set_result(t_type)
                         Logger.success(f"[RX ACK] 确认成功")
                     else:
-                        Logger.warning(f"[RX ACK] 序号不匹配 (期望{self.seq_num}，收到{seq})")
+                        Logger.warning(f"[RX ACK] 没有等待该确认的发送 (来自{src_id}，Seq={seq})")
                         
             except ValueError as e:
                 Logger.error(f"解析错误: {e}")
             return
         
-        # --- 转发 ---
-        with self.rt_lock:
-            route = self.routing_table.get(dst_id)
-            if route and route['cost'] < 999:
-                next_port = route['next_hop_port']
-                packet = f"{TYPE_DATA}{SEPARATOR}{src_id}{SEPARATOR}{dst_id}{SEPARATOR}{payload}"
-                Logger.info(f"[Forward] {src_id}->{dst_id} via {next_port}")
-                self._send_to_port(next_port, packet)
-            else:
-                Logger.warning(f"[Drop] 目标不可达: {dst_id}")
+        # --- 转发 (读路由表当前快照，无需加锁) ---
+        route = self.routing_table.get(dst_id)
+        if route and route['cost'] < 999:
+            next_port = route['next_hop_port']
+            Logger.info(f"[Forward] {src_id}->{dst_id} via {next_port}")
+            self._send_to_port(next_port, raw_data)
+        else:
+            Logger.warning(f"[Drop] 目标不可达: {dst_id}")
 
     def _network_send(self, target_id, packet_content):
         """查找路由并发送完整网络层包（支持模拟丢包）"""
-        with self.rt_lock:
-            route = self.routing_table.get(target_id)
-            if not route:
-                Logger.error(f"错误: 找不到去往 {target_id} 的路由")
-                return False
-            if route['cost'] >= 999:
-                Logger.error(f"错误: 目标 {target_id} 当前不可达")
-                return False
-            
-            port = route['next_hop_port']
-            self._send_to_port_with_simulation(port, packet_content)
-            return True
+        route = self.routing_table.get(target_id)
+        if not route:
+            Logger.error(f"错误: 找不到去往 {target_id} 的路由")
+            return False
+        if route['cost'] >= 999:
+            Logger.error(f"错误: 目标 {target_id} 当前不可达")
+            return False
+        
+        port = route['next_hop_port']
+        self._send_to_port_with_simulation(port, packet_content)
+        return True
 
     def _initiate_reliable_send(self, target_id, msg):
         """停等协议发送逻辑 (Blocking)"""
         # [Step 1] 发送 SYN 建立会话
         seq = random.randint(0, 65535)
-        self.seq_num = seq
-        
         t_type = TRANS_TYPE_SYN
         
+        # 登记本次发送等待的确认，由接收线程在收到对应 SYN-ACK 时完成
+        ack_key = (target_id, seq)
+        ack_future = concurrent.futures.Future()
+        with self.pending_lock:
+            self.pending_acks[ack_key] = ack_future
+        
         Logger.info(f"\n=== 开始可靠发送到 {target_id} ===")
         print(f"[TX] 发送 SYN (Seq={seq}, 数据='{msg}')")
         
+        target_b = _id_bytes(target_id)
+        msg_b = msg.encode('utf-8')
+        
         syn_ack_received = False
+        try:
+            syn_ack_received = self._send_until_acked(target_id, seq, t_type, target_b, msg_b, ack_future)
+        finally:
+            with self.pending_lock:
+                self.pending_acks.pop(ack_key, None)
+        
+        if not syn_ack_received:
+            Logger.error("=== 发送失败: 无法建立会话 ===\n")
+            return
+        
+        Logger.success("=== 发送成功 ===\n")
+
+    def _send_until_acked(self, target_id, seq, t_type, target_b, msg_b, ack_future):
+        """重传循环：直到 ack_future 完成或达到最大重传次数，返回是否收到确认"""
+        # 重传内容不变，校验码和整包只计算一次
+        t_type_b = TRANS_TYPE_B[t_type]
+        chk = self._calculate_checksum(self._my_id_b, target_b, seq, t_type_b, msg_b)
+        good_packet = self._build_data_packet(target_b, seq, chk, t_type_b, msg_b)
+        
         for attempt in range(MAX_RETRIES):
-            # [RE-CALC]
-            chk = self._calculate_checksum(self.my_id, target_id, seq, t_type, msg)
+            if not self.running:
+                return False  # 程序退出时不再重传，让后台发送线程尽快结束
+            packet = good_packet
             
-            # [干扰逻辑]
-            if self.corruption_count > 0:
-                Logger.warning(f"[Simulate] 模拟校验码错误 (剩余干扰次数: {self.corruption_count})")
-                chk += 123
-                self.corruption_count -= 1
-            elif self.simulate_error: 
-                Logger.warning(f"[Simulate] 模拟校验码错误 (本次)")
-                chk += 123
-                self.simulate_error = False
-
-            tf_str = f"0{SEPARATOR}0{SEPARATOR}{seq}{SEPARATOR}{chk}{SEPARATOR}{t_type}{SEPARATOR}{msg}"
-            packet = f"{TYPE_DATA}{SEPARATOR}{self.my_id}{SEPARATOR}{target_id}{SEPARATOR}{tf_str}"
+            # [干扰逻辑] 仅在模拟校验错误时另行构造错误包
+            remaining = self._take_corrupt()
+            if remaining is not None:
+                Logger.warning(f"[Simulate] 模拟校验码错误 (剩余干扰次数: {remaining})")
+                packet = self._build_data_packet(target_b, seq, chk + 123, t_type_b, msg_b)
 
             if not self._network_send(target_id, packet):
                 Logger.error("发送失败: 网络层无法发送")
-                break
-            
-            print(f"[TX] SYN发送 (尝试 {attempt+1}/{MAX_RETRIES})... 等待SYN-ACK")
+                return False
             
-            self.ack_event.clear()
-            self.received_ack_seq = -1
+            # 指数退避 + 随机抖动，避免持续丢包时以固定间隔冲击链路
+            delay = min(MAX_RETRANSMIT_DELAY, TIMEOUT_RETRANSMIT * RETRANSMIT_BACKOFF ** attempt)
+            delay *= random.uniform(0.9, 1.1)
+            print(f"[TX] SYN发送 (尝试 {attempt+1}/{MAX_RETRIES})... 等待SYN-ACK ({delay:.1f}s)")
             
-            if self.ack_event.wait(TIMEOUT_RETRANSMIT):
-                if self.received_ack_seq == seq:
-                    Logger.success(f"[TX] 收到 SYN-ACK，会话已建立")
-                    syn_ack_received = True
-                    break
-                else:
-                    Logger.warning(f"[TX] 收到非期望的ACK: {self.received_ack_seq}，继续等待...")
-            else:
+            try:
+                ack_future.result(timeout=delay)
+                Logger.success(f"[TX] 收到 SYN-ACK，会话已建立")
+                return True
+            except concurrent.futures.TimeoutError:
                 Logger.warning(f"[TX] 超时，准备重传...")
-        
-        if not syn_ack_received:
-            Logger.error("=== 发送失败: 无法建立会话 ===\n")
-            return
-        
-        Logger.success("=== 发送成功 ===\n")
+            except concurrent.futures.CancelledError:
+                return False  # 程序退出 (见 _shutdown)
+        return False
+
+    def _take_corrupt(self):
+        """消耗一次模拟校验错误，返回剩余次数；未开启时返回 None"""
+        if not self._corrupt_left:
+            return None
+        with self._corrupt_lock:
+            if self._corrupt_left <= 0:
+                return None  # 已被其他发送线程取走
+            self._corrupt_left -= 1
+            return self._corrupt_left
+
+    def _set_corrupt(self, count):
+        with self._corrupt_lock:
+            self._corrupt_left = count
 
     # === 定时任务 (Hello/DV) ===
     def _task_hello(self):
+        packet = SEP_B.join((TYPE_HELLO_B, self._my_id_b))
         while self.running:
-            packet = f"{TYPE_HELLO}{SEPARATOR}{self.my_id}"
             for port in list(self.active_ports.keys()): 
                 self._send_to_port(port, packet)
             time.sleep(HELLO_INTERVAL)
 
     def _task_broadcast_dv(self):
         while self.running:
-            dv_snapshot = {}
-            with self.rt_lock:
-                for dest, info in self.routing_table.items():
-                    dv_snapshot[dest] = {'cost': info['cost']}
-            dv_str = json.dumps(dv_snapshot)
-            packet = f"{TYPE_DV}{SEPARATOR}{self.my_id}{SEPARATOR}{dv_str}"
+            packet = self._get_dv_packet()
             for port in list(self.active_ports.keys()):
                 self._send_to_port(port, packet)
             time.sleep(DV_INTERVAL)
 
+    def _get_dv_packet(self):
+        """返回 DV 包 bytes；路由表未变化时直接复用上次的序列化结果"""
+        with self._rt_write_lock:
+            if not self._dv_dirty:
+                return self._dv_cache_bytes
+            table = self.routing_table
+            self._dv_dirty = False
+        dv_snapshot = {dest: info['cost'] for dest, info in table.items()}
+        self._dv_cache_bytes = SEP_B.join((TYPE_DV_B, self._my_id_b, self._encode_dv(dv_snapshot)))
+        return self._dv_cache_bytes
+
     def _task_check_timeout(self):
         while self.running:
             now = time.time()
-            timeout_ports = []
-            with self.neighbors_lock:
-                for port, info in self.neighbors.items():
-                    if now - info['last_seen'] > NEIGHBOR_TIMEOUT:
-                        Logger.warning(f"[连接断开] 邻居 {info['id']} ({port}) 超时")
-                        timeout_ports.append(port)
-                for p in timeout_ports:
-                    del self.neighbors[p]
+            timeout_ports = [port for port, info in self.neighbors.items()
+                             if now - info['last_seen'] > NEIGHBOR_TIMEOUT]
             if timeout_ports:
-                with self.rt_lock:
-                    for dest, info in self.routing_table.items():
-                        if info['next_hop_port'] in timeout_ports and dest != self.my_id:
-                            info['cost'] = 999
+                dropped = []  # 加锁复查后真正删除的端口
+                with self._nbr_write_lock:
+                    new_nbrs = dict(self.neighbors)
+                    for p in timeout_ports:
+                        info = new_nbrs.get(p)
+                        # 加锁后复查，期间可能刚收到该邻居的 HELLO
+                        if info and now - info['last_seen'] > NEIGHBOR_TIMEOUT:
+                            Logger.warning(f"[连接断开] 邻居 {info['id']} ({p}) 超时")
+                            del new_nbrs[p]
+                            dropped.append(p)
+                            self._drop_expected_seq(info['id'])  # 重新连上后会用新的 SYN 同步
+                    self.neighbors = new_nbrs
+                if dropped:
+                    with self._rt_write_lock:
+                        new_tbl = dict(self.routing_table)
+                        updated = False
+                        for dest, info in new_tbl.items():
+                            if info['next_hop_port'] in dropped and dest != self.my_id and info['cost'] != 999:
+                                new_tbl[dest] = dict(info, cost=999)
+                                updated = True
+                        if updated:
+                            self.routing_table = new_tbl
+                            self._dv_dirty = True
             time.sleep(1)
 
     # === UI ===
@@ -491,24 +737,27 @@ class ReliableRouterNode:
                 elif op == 'corrupt':
                     if len(parts) > 1:
                         val = parts[1]
-                        if val.isdigit():
-                            self.corruption_count = int(val)
-                            Logger.info(f"模拟校验错误已开启 (下 {self.corruption_count} 次)")
+                        if val.lstrip('-').isdigit():
+                            n = int(val)
+                            if not 0 < n <= MAX_CORRUPT_COUNT:
+                                Logger.error(f"次数须在 1~{MAX_CORRUPT_COUNT} 之间")
+                                continue
+                            self._set_corrupt(n)
+                            Logger.info(f"模拟校验错误已开启 (下 {n} 次)")
                         elif val == 'on':
-                            self.corruption_count = 5 
+                            self._set_corrupt(5)
                             Logger.info(f"模拟校验错误已开启 (默认5次)")
                         else:
-                             self.simulate_error = False
-                             self.corruption_count = 0
-                             Logger.info("模拟校验错误已关闭")
+                            self._set_corrupt(0)
+                            Logger.info("模拟校验错误已关闭")
                     else:
                         print("用法: corrupt <on/off/次数>")
                 elif op == 'loss':
+                    self._loss_q.clear()
                     if len(parts) > 1 and parts[1] == 'on':
-                        self.simulate_loss = True
+                        self._loss_q.append(True)
                         Logger.info("模拟丢包已开启 (下一次)")
                     else:
-                        self.simulate_loss = False
                         Logger.info("模拟丢包已关闭")
                 elif op == 'send':
                     if len(parts) < 3:
@@ -516,21 +765,41 @@ class ReliableRouterNode:
                         continue
                     target = parts[1]
                     msg = parts[2]
-                    self._initiate_reliable_send(target, msg)
+                    future = self._send_pool.submit(self._initiate_reliable_send, target, msg)
+                    future.add_done_callback(self._on_send_done)
                 elif op == 'help' or op == 'h' or op == '?':
                     self._print_help()
                 elif op == 'exit' or op == 'quit':
-                    self.running = False
+                    self._shutdown()
                     for s in self.active_ports.values(): s.close()
                     sys.exit(0)
                 else:
                     print(f"未知命令: {op}。输入 'help' 查看帮助。")
             except KeyboardInterrupt:
-                self.running = False
+                self._shutdown()
                 sys.exit(0)
             except Exception as e:
                 Logger.error(f"Error: {e}")
     
+    def _shutdown(self):
+        """退出前让后台发送线程立即结束: 解释器退出时会 join 线程池的工作线程"""
+        self.running = False
+        # 取消所有等待中的确认，阻塞在 ack_future.result() 上的发送线程马上返回
+        with self.pending_lock:
+            pending, self.pending_acks = self.pending_acks, {}
+        for fut in pending.values():
+            fut.cancel()
+        # 尚未开始的发送任务直接丢弃
+        self._send_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _on_send_done(self, future):
+        """后台发送结束回调: 线程池会吞掉异常，这里打印出来"""
+        if future.cancelled():
+            return  # 退出时被丢弃的发送任务
+        e = future.exception()
+        if e:
+            Logger.error(f"发送出错: {e}")
+
     def _print_help(self):
         print("""
 === 可靠传输路由节点 - 命令帮助 ===
@@ -549,10 +818,9 @@ class ReliableRouterNode:
         print("="*60)
         print(f"{'目标':<10} {'开销':<10} {'下一跳':<10} {'接口':<15}")
         print("-"*60)
-        with self.rt_lock:
-            for dest, info in self.routing_table.items():
-                cost_str = str(info['cost']) if info['cost'] < 999 else "∞"
-                print(f"{dest:<10} {cost_str:<10} {info['next_hop_id']:<10} {info['next_hop_port']:<15}")
+        for dest, info in self.routing_table.items():
+            cost_str = str(info['cost']) if info['cost'] < 999 else "∞"
+            print(f"{dest:<10} {cost_str:<10} {info['next_hop_id']:<10} {info['next_hop_port']:<15}")
         print("="*60 + "\n")
 
 if __name__ == '__main__':
@@ -13,6 +13,9 @@ import json
 import sys
 import zlib
 import os
+import selectors
+import itertools
+from collections import defaultdict
 
 # 导入 utils
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -24,6 +27,12 @@ TYPE_DV    = 'DV'
 TYPE_DATA  = 'DATA'  
 SEPARATOR  = '|'
 
+# 收发路径直接处理 bytes，类型字段按 bytes 比较
+TYPE_HELLO_B = TYPE_HELLO.encode('ascii')
+TYPE_DV_B    = TYPE_DV.encode('ascii')
+TYPE_DATA_B  = TYPE_DATA.encode('ascii')
+SEP_B        = SEPARATOR.encode('ascii')
+
 # 内部子协议类型
 PROTO_TRANSPORT = 'TRA' # 实验五的可靠传输
 PROTO_ICMP      = 'ICMP' # 实验六的网络管理
@@ -33,6 +42,15 @@ ICMP_ECHO_REQUEST = 'ECHO_REQ'
 ICMP_ECHO_REPLY   = 'ECHO_REP'
 ICMP_TIME_EXCEEDED = 'TIME_EXC'
 
+# 预先拼好的固定前缀 (构造包时只需追加可变字段)
+_ICMP_REQ_PREFIX = f"{PROTO_ICMP}{SEPARATOR}{ICMP_ECHO_REQUEST}{SEPARATOR}"
+_ICMP_REP_PREFIX = f"{PROTO_ICMP}{SEPARATOR}{ICMP_ECHO_REPLY}{SEPARATOR}"
+_ICMP_TE_PREFIX  = f"{PROTO_ICMP}{SEPARATOR}{ICMP_TIME_EXCEEDED}{SEPARATOR}"
+_TRANSPORT_PREFIX = f"{PROTO_TRANSPORT}{SEPARATOR}"
+
+# 节点ID驻留: 每个包解析出的ID都是新字符串，驻留后路由表等 dict 查找可直接按身份命中
+_intern = sys.intern
+
 # 配置
 # BAUDRATE = 9600
 HELLO_INTERVAL = 3
@@ -40,24 +58,49 @@ DV_INTERVAL    = 5
 NEIGHBOR_TIMEOUT = 10
 DEFAULT_TTL = 64
 
+# 本机发送 DV 的格式: 'compact' (默认) 或 'json' (与旧版节点互通时使用)
+# compact: Dest:Cost;Dest:Cost;...   json: {"Dest": {"cost": Cost}, ...}
+# 接收端按首字符 '{' 自动识别，两种格式都能解析
+DV_FORMAT = 'compact'
+DV_ENTRY_SEP = ';'
+DV_COST_SEP  = ':'
+
 class NetworkNode:
     def __init__(self):
         self.my_id = ""
         self.running = False
+        # 依赖 my_id 的固定前缀 (已编码)，在 start() 确定ID后设置
+        self._data_prefix = b""   # DATA|<my_id>|
+        self._hello_packet = b""  # HELLO|<my_id>\n
+        self._dv_prefix = b""     # DV|<my_id>|
         
         self.active_ports = {}
         self.port_locks = {}
+        self._rx_buffers = {}  # 每个端口尚未凑成整行的接收数据
         self.neighbors = {} 
         self.neighbors_lock = threading.Lock()
 
+        # 路由表为写时复制 (RCU 风格): 读者直接读取当前引用，无需加锁；
+        # 写者在写锁内复制、修改后整体替换引用。表项 dict 发布后不再原地修改。
         self.routing_table = {}
-        self.rt_lock = threading.Lock()
+        self._rt_write_lock = threading.Lock()
+        # 反向索引 (仅写者在写锁内使用): 下一跳ID/端口 -> 经由它的目标集合，
+        # 邻居失效或毒化时只需处理受影响的目标，不必扫描整张路由表
+        self._by_nexthop_id = defaultdict(set)
+        self._by_nexthop_port = defaultdict(set)
         
         # Ping/Tracert State Management
+        # {seq: (Event, [result])}: 等待方登记，接收线程 pop 后写入结果并 set。
+        # dict 的赋值和 pop 在 GIL 下是原子的，且每个 seq 只会被 pop 一次，因此无需加锁
         self.icmp_events = {}
-        self.icmp_results = {}
-        self.icmp_lock = threading.Lock()
-        self.seq_counter = 0
+        self._seq_gen = itertools.count()  # ICMP 序号发生器，next() 是原子的，多线程共用无需加锁
+
+        # 包类型 -> 处理函数，_handle_packet 一次查表分发
+        self._dispatch = {
+            TYPE_HELLO_B: self._dispatch_hello,
+            TYPE_DV_B:    self._dispatch_dv,
+            TYPE_DATA_B:  self._dispatch_data,
+        }
 
     def start(self):
         print("="*60)
@@ -74,23 +117,38 @@ class NetworkNode:
         
         # 2. 本机ID
         while not self.my_id:
-            self.my_id = input("本机ID: ").strip()
-
-        self.routing_table[self.my_id] = {'cost': 0, 'next_hop_port': 'LOCAL', 'next_hop_id': self.my_id}
+            self.my_id = _intern(input("本机ID: ").strip())
+        self._data_prefix = f"{TYPE_DATA}{SEPARATOR}{self.my_id}{SEPARATOR}".encode('utf-8')
+        self._hello_packet = f"{TYPE_HELLO}{SEPARATOR}{self.my_id}\n".encode('utf-8')
+        self._dv_prefix = f"{TYPE_DV}{SEPARATOR}{self.my_id}{SEPARATOR}".encode('utf-8')
+
+        new_tbl = {}
+        self._set_route(new_tbl, self.my_id, {'cost': 0, 'next_hop_port': 'LOCAL', 'next_hop_id': self.my_id})
+        self.routing_table = new_tbl
         self.running = True
 
+        # POSIX 下所有串口注册到同一个 selector，由单个 _rx_loop 线程接收；
+        # Windows 的串口句柄不支持 select，仍为每个端口启动一个 _listen_port 线程
+        use_selector = not sys.platform.startswith('win')
+        sel = selectors.DefaultSelector() if use_selector else None
         for p in ports:
             try:
                 ser = create_serial_connection(p, timeout=0.1)
                 if ser:
                     self.active_ports[p] = ser
                     self.port_locks[p] = threading.Lock()
-                    threading.Thread(target=self._listen_port, args=(p,), daemon=True).start()
+                    self._rx_buffers[p] = bytearray()
+                    if use_selector:
+                        sel.register(ser, selectors.EVENT_READ, data=p)
+                    else:
+                        threading.Thread(target=self._listen_port, args=(p,), daemon=True).start()
                     Logger.info(f"[{p}] 监听中...")
                 else:
                     Logger.error(f"[{p}] 打开失败")
             except Exception as e:
                 Logger.error(f"[{p}] 异常: {e}")
+        if use_selector:
+            threading.Thread(target=self._rx_loop, args=(sel,), daemon=True).start()
 
         # 启动后台任务
         threading.Thread(target=self._task_hello, daemon=True).start()
@@ -101,55 +159,96 @@ class NetworkNode:
         self._input_loop()
 
     # === 基础通信 ===
+    def _rx_loop(self, sel):
+        """单线程接收所有串口 (selector 多路复用)"""
+        while self.running:
+            for key, _ in sel.select(timeout=1.0):
+                ser, port = key.fileobj, key.data
+                try:
+                    self._rx_buffers[port] += ser.read(ser.in_waiting or 1)
+                except Exception:
+                    sel.unregister(ser)
+                    continue
+                # 所有端口共用这一个线程：单个异常包不能终止接收循环
+                try:
+                    self._dispatch_lines(port)
+                except Exception as e:
+                    Logger.error(f"[{port}] 处理数据包出错: {e}")
+        sel.close()
+
     def _listen_port(self, port):
+        """单端口接收线程 (Windows 下使用)"""
         ser = self.active_ports[port]
         while self.running and ser.is_open:
             try:
-                if ser.in_waiting:
-                    line = ser.readline().decode('utf-8', errors='ignore').strip()
-                    if line: self._handle_packet(line, port)
-                else:
-                    time.sleep(0.01)
+                # 一次取走缓冲区内所有数据；空闲时 read(1) 阻塞等待 (受串口 timeout 限制)，无需 sleep 轮询
+                self._rx_buffers[port] += ser.read(max(1, ser.in_waiting))
             except:
                 break
-
-    def _send_bytes(self, port, data_str):
+            # 处理出错只丢弃该包，不关闭端口监听
+            try:
+                self._dispatch_lines(port)
+            except Exception as e:
+                Logger.error(f"[{port}] 处理数据包出错: {e}")
+
+    def _dispatch_lines(self, port):
+        """从端口接收缓冲区中切出完整的行并处理"""
+        buf = self._rx_buffers[port]
+        while (nl := buf.find(b'\n')) >= 0:
+            line = bytes(buf[:nl]).strip()
+            del buf[:nl + 1]
+            if line: self._handle_packet(line, port)
+
+    def _send_bytes(self, port, data):
+        """data 为已编码、带行尾 '\\n' 的完整一行"""
         if port not in self.active_ports: return
         with self.port_locks[port]:
             try:
-                self.active_ports[port].write((data_str + '\n').encode('utf-8'))
+                self.active_ports[port].write(data)
             except Exception as e:
                 Logger.error(f"Send Error on {port}: {e}")
 
     # === 核心处理 ===
     def _handle_packet(self, raw, port_src):
-        try:
-            parts = raw.split(SEPARATOR, 4)
-            # 简单起见，先按最少分割，再根据类型细分
-            base_parts = raw.split(SEPARATOR)
-            p_type = base_parts[0]
-            
-            if p_type == TYPE_HELLO:
-                if len(base_parts) > 1: self._on_recv_hello(base_parts[1], port_src)
-            elif p_type == TYPE_DV:
-                if len(base_parts) > 2: self._on_recv_dv(base_parts[1], base_parts[2], port_src)
-            elif p_type == TYPE_DATA:
-                # DATA|Src|Dst|TTL|Payload(Type|Body)
-                # Payload 内部再解析
-                if len(base_parts) < 5: return
-                src, dst, ttl_str, payload = base_parts[1], base_parts[2], base_parts[3], SEPARATOR.join(base_parts[4:])
-                self._process_network_packet(src, dst, int(ttl_str), payload)
-                
-        except Exception as e:
-            # Logger.debug(f"Parse Error: {e}")
-            pass
-
-    def _process_network_packet(self, src_id, dst_id, ttl, payload):
-        """网络层处理：转发、或者是给我的"""
+        """raw 为收到的一行 bytes (已去掉行尾)，只解码需要的字段"""
+        # 格式错误的包由各处理函数显式检查后丢弃，正常包不经过异常处理
+        # (DV/应用层负载的解析在 _on_recv_dv / _handle_application_payload 内自行捕获异常)
+        # 用 find 定位分隔符，只切出需要的字段 (不生成整行的 split 列表)
+        i1 = raw.find(SEP_B)
+        if i1 < 0: return
+        handler = self._dispatch.get(raw[:i1])
+        if handler:
+            handler(raw, i1, port_src)
+
+    # 以下 _dispatch_* 的参数: raw 为整行，i1 为类型字段后第一个分隔符的位置
+    def _dispatch_hello(self, raw, i1, port_src):
+        self._on_recv_hello(_intern(raw[i1+1:].decode('utf-8', errors='ignore')), port_src)
+
+    def _dispatch_dv(self, raw, i1, port_src):
+        i2 = raw.find(SEP_B, i1 + 1)
+        if i2 < 0: return
+        self._on_recv_dv(_intern(raw[i1+1:i2].decode('utf-8', errors='ignore')),
+                         raw[i2+1:].decode('utf-8', errors='ignore'), port_src)
+
+    def _dispatch_data(self, raw, i1, port_src):
+        # DATA|Src|Dst|TTL|Payload(Type|Body)
+        # Payload 保持 bytes，只有交付本机时才解码
+        i2 = raw.find(SEP_B, i1 + 1)
+        i3 = raw.find(SEP_B, i2 + 1) if i2 >= 0 else -1
+        i4 = raw.find(SEP_B, i3 + 1) if i3 >= 0 else -1
+        if i4 < 0: return
+        ttl_b = raw[i3+1:i4]
+        if not ttl_b.isdigit(): return
+        src = _intern(raw[i1+1:i2].decode('utf-8', errors='ignore'))
+        dst = _intern(raw[i2+1:i3].decode('utf-8', errors='ignore'))
+        self._process_network_packet(src, dst, int(ttl_b), raw[i4+1:], raw, (i3 + 1, i4))
+
+    def _process_network_packet(self, src_id, dst_id, ttl, payload, raw, ttl_span):
+        """网络层处理：转发、或者是给我的 (raw 为收到的整个包，ttl_span 为其中 TTL 字段的位置)"""
         
         # 1. 如果是发给我的
         if dst_id == self.my_id:
-            self._handle_application_payload(src_id, payload)
+            self._handle_application_payload(src_id, payload.decode('utf-8', errors='ignore'))
             return
 
         # 2. 也是关键点：TTL处理与转发
@@ -158,19 +257,17 @@ class NetworkNode:
         if ttl <= 0:
             # TTL耗尽，发送 ICMP Time Exceeded 给 Source
             # Logger.debug(f"[TTL Exceeded] Drop packet from {src_id} to {dst_id}")
-            self._send_icmp_time_exceeded(src_id, payload)
+            self._send_icmp_time_exceeded(src_id, payload.decode('utf-8', errors='ignore'))
             return
 
-        # 查找路由转发
-        with self.rt_lock:
-            route = self.routing_table.get(dst_id)
-            if route and route['cost'] < 999:
-                next_port = route['next_hop_port']
-                # 重新打包
-                packet = f"{TYPE_DATA}{SEPARATOR}{src_id}{SEPARATOR}{dst_id}{SEPARATOR}{ttl}{SEPARATOR}{payload}"
-                self._send_bytes(next_port, packet)
-            else:
-                pass 
+        # 查找路由转发 (读当前快照，无需加锁)
+        route = self.routing_table.get(dst_id)
+        if route and route['cost'] < 999:
+            next_port = route['next_hop_port']
+            # 只替换 TTL 字段，其余部分沿用收到的原包
+            ttl_start, ttl_end = ttl_span
+            packet = b''.join((raw[:ttl_start], b'%d' % ttl, raw[ttl_end:], b'\n'))
+            self._send_bytes(next_port, packet)
 
     def _handle_application_payload(self, src_id, payload):
         """应用层/传输层分发"""
@@ -189,17 +286,19 @@ class NetworkNode:
 
     # === ICMP 实现 ===
     # Format: Type|Seq|Timestamp
+    # 请求中的时间戳为发送方的 time.monotonic_ns()，对方原样回显，只由发送方自己解读，
+    # 因此不受系统时间调整影响，RTT 用整数纳秒相减
     
     def _send_icmp_echo_request(self, target, seq, ttl=DEFAULT_TTL):
-        ts = time.time()
+        ts = time.monotonic_ns()
         # Payload: ICMP|ECHO_REQ|Seq|Ts
-        payload = f"{PROTO_ICMP}{SEPARATOR}{ICMP_ECHO_REQUEST}{SEPARATOR}{seq}{SEPARATOR}{ts}"
+        payload = f"{_ICMP_REQ_PREFIX}{seq}{SEPARATOR}{ts}"
         self._network_send(target, payload, ttl)
 
     def _send_icmp_echo_reply(self, target, seq, orig_ts):
         # Payload: ICMP|ECHO_REP|Seq|OrigTs|RecvTs
         recv_ts = time.time()
-        payload = f"{PROTO_ICMP}{SEPARATOR}{ICMP_ECHO_REPLY}{SEPARATOR}{seq}{SEPARATOR}{orig_ts}{SEPARATOR}{recv_ts}"
+        payload = f"{_ICMP_REP_PREFIX}{seq}{SEPARATOR}{orig_ts}{SEPARATOR}{recv_ts}"
         self._network_send(target, payload, DEFAULT_TTL)
 
     def _send_icmp_time_exceeded(self, target, orig_payload):
@@ -208,7 +307,7 @@ class NetworkNode:
             parts = orig_payload.split(SEPARATOR)
             if parts[0] == PROTO_ICMP and parts[1] == ICMP_ECHO_REQUEST:
                 seq = parts[2]
-                payload = f"{PROTO_ICMP}{SEPARATOR}{ICMP_TIME_EXCEEDED}{SEPARATOR}{seq}{SEPARATOR}{self.my_id}"
+                payload = f"{_ICMP_TE_PREFIX}{seq}{SEPARATOR}{self.my_id}"
                 self._network_send(target, payload, DEFAULT_TTL)
         except:
             pass
@@ -226,36 +325,45 @@ class NetworkNode:
         elif icmp_type == ICMP_ECHO_REPLY:
             # 收到回显
             seq = int(parts[1])
-            orig_ts = float(parts[2])
+            orig_ts = int(parts[2])
             
-            rtt = (time.time() - orig_ts) * 1000 # ms
+            rtt = (time.monotonic_ns() - orig_ts) / 1e6 # ms
             # 通知等待线程
-            with self.icmp_lock:
-                if seq in self.icmp_events:
-                    self.icmp_results[seq] = {'type': 'REPLY', 'src': src_id, 'rtt': rtt}
-                    self.icmp_events[seq].set()
+            self._complete_icmp(seq, {'type': 'REPLY', 'src': src_id, 'rtt': rtt})
 
         elif icmp_type == ICMP_TIME_EXCEEDED:
             # TTL 过期
             seq = int(parts[1])
             router_id = parts[2]
             
-            with self.icmp_lock:
-                if seq in self.icmp_events:
-                    self.icmp_results[seq] = {'type': 'EXPIRED', 'src': router_id}
-                    self.icmp_events[seq].set()
+            self._complete_icmp(seq, {'type': 'EXPIRED', 'src': router_id})
+
+    def _register_icmp(self, seq, waiter):
+        """
+        登记一个等待中的 ICMP 请求。waiter = (Event, 结果盒) 由调用方创建一次、
+        在多次请求间复用 (ping/tracert 每次只有一个请求在途)，这里先复位再登记
+        """
+        evt, box = waiter
+        evt.clear()
+        box[0] = None
+        self.icmp_events[seq] = waiter
+
+    def _complete_icmp(self, seq, result):
+        waiter = self.icmp_events.pop(seq, None)
+        if waiter:
+            evt, box = waiter
+            box[0] = result
+            evt.set()
 
     def _network_send(self, dst_id, payload, ttl):
-        packet = f"{TYPE_DATA}{SEPARATOR}{self.my_id}{SEPARATOR}{dst_id}{SEPARATOR}{ttl}{SEPARATOR}{payload}"
-        
         # 路由查找
-        with self.rt_lock:
-            route = self.routing_table.get(dst_id)
-            if not route or route['cost'] >= 999:
-                return False
-            port = route['next_hop_port']
-            self._send_bytes(port, packet)
-            return True
+        route = self.routing_table.get(dst_id)
+        if not route or route['cost'] >= 999:
+            return False
+        port = route['next_hop_port']
+        packet = self._data_prefix + f"{dst_id}{SEPARATOR}{ttl}{SEPARATOR}{payload}\n".encode('utf-8')
+        self._send_bytes(port, packet)
+        return True
 
     # === API Ping/Traceroute ===
     
@@ -263,20 +371,18 @@ class NetworkNode:
         print(f"\nPing {target_id} with 32 bytes of data:")
         lost = 0
         rtts = []
+        waiter = evt, box = threading.Event(), [None]
         
         for i in range(count):
-            seq = self.seq_counter
-            self.seq_counter += 1
+            seq = next(self._seq_gen)
             
-            evt = threading.Event()
-            with self.icmp_lock:
-                self.icmp_events[seq] = evt
+            self._register_icmp(seq, waiter)
             
             self._send_icmp_echo_request(target_id, seq)
             
             # Wait
             if evt.wait(2.0): # 2s timeout
-                res = self.icmp_results.get(seq)
+                res = box[0]
                 if res and res['type'] == 'REPLY':
                     rtt = res['rtt']
                     rtts.append(rtt)
@@ -287,11 +393,8 @@ class NetworkNode:
             else:
                 print("请求超时.")
                 lost += 1
-                
-            # Cleanup
-            with self.icmp_lock:
+                # 超时未被接收线程取走，自行清理
                 self.icmp_events.pop(seq, None)
-                self.icmp_results.pop(seq, None)
                 
             time.sleep(1)
 
@@ -305,24 +408,22 @@ class NetworkNode:
 
     def do_traceroute(self, target_id, max_hops=15):
         print(f"\nTracing route to {target_id} over a maximum of {max_hops} hops:\n")
+        waiter = evt, box = threading.Event(), [None]
         
         for ttl in range(1, max_hops + 1):
-            seq = self.seq_counter
-            self.seq_counter += 1
+            seq = next(self._seq_gen)
             
-            evt = threading.Event()
-            with self.icmp_lock:
-                self.icmp_events[seq] = evt
+            self._register_icmp(seq, waiter)
             
-            start_t = time.time()
+            start_t = time.monotonic()
             # 发送 TTL=ttl 的 Echo Request
             self._send_icmp_echo_request(target_id, seq, ttl=ttl)
             
             print(f"{ttl:2d}  ", end='', flush=True)
             
             if evt.wait(3.0):
-                rtt = (time.time() - start_t) * 1000
-                res = self.icmp_results.get(seq)
+                rtt = (time.monotonic() - start_t) * 1000
+                res = box[0]
                 
                 if not res:
                     print(f"    *     Error")
@@ -332,88 +433,133 @@ class NetworkNode:
                     # 到达目的地
                     print(f"  {rtt:6.1f} ms    {res['src']}")
                     print("\nTrace complete.")
-                    with self.icmp_lock:
-                        self.icmp_events.pop(seq, None)
-                        self.icmp_results.pop(seq, None)
                     return
             else:
                 print(f"    *        Request timed out.")
-                
-            with self.icmp_lock:
                 self.icmp_events.pop(seq, None)
-                self.icmp_results.pop(seq, None)
 
     # === Helper (Hello/DV/Routing) ===
     def _on_recv_hello(self, sender_id, port):
         with self.neighbors_lock:
-            self.neighbors[port] = {'id': sender_id, 'last_seen': time.time()}
-        with self.rt_lock:
+            self.neighbors[port] = {'id': sender_id, 'last_seen': time.monotonic()}
+        cur = self.routing_table.get(sender_id)
+        if cur and cur['cost'] <= 1:
+            return
+        with self._rt_write_lock:
             cur = self.routing_table.get(sender_id)
             if not cur or cur['cost'] > 1:
-                self.routing_table[sender_id] = {'cost': 1, 'next_hop_port': port, 'next_hop_id': sender_id}
+                new_tbl = dict(self.routing_table)
+                self._set_route(new_tbl, sender_id, {'cost': 1, 'next_hop_port': port, 'next_hop_id': sender_id})
+                self.routing_table = new_tbl
+
+    def _set_route(self, tbl, dst, entry):
+        """写入路由表项并同步反向索引 (调用方持有 _rt_write_lock)"""
+        old = tbl.get(dst)
+        if old:
+            self._by_nexthop_id[old['next_hop_id']].discard(dst)
+            self._by_nexthop_port[old['next_hop_port']].discard(dst)
+        tbl[dst] = entry
+        self._by_nexthop_id[entry['next_hop_id']].add(dst)
+        self._by_nexthop_port[entry['next_hop_port']].add(dst)
 
     def _send_dv_updates(self):
         """发送路由更新（支持毒性逆转）"""
-        with self.rt_lock:
-            snapshot = {k:v.copy() for k,v in self.routing_table.items()}
+        # 路由表为不可变快照，直接取引用即可，无需加锁复制
+        snapshot = self.routing_table
+        base = {dest: info['cost'] for dest, info in snapshot.items()}
         
+        # 各端口的 DV 只在"下一跳为该端口"的目标上不同 (毒性逆转)，
+        # 按被毒化的目标集合缓存序列化结果，集合相同的端口共用同一个包
+        pkt_cache = {}
         current_ports = list(self.active_ports.keys())
         for port_out in current_ports:
             # Poison Reverse Logic
-            custom_dv = {}
-            for dest, info in snapshot.items():
-                cost = info['cost']
-                if info.get('next_hop_port') == port_out:
-                    cost = 999 
-                custom_dv[dest] = {'cost': cost}
-            
-            pkt = f"{TYPE_DV}{SEPARATOR}{self.my_id}{SEPARATOR}{json.dumps(custom_dv)}"
+            poisoned = frozenset(dest for dest, info in snapshot.items() if info.get('next_hop_port') == port_out)
+            pkt = pkt_cache.get(poisoned)
+            if pkt is None:
+                custom_dv = {**base, **{dest: 999 for dest in poisoned}} if poisoned else base
+                pkt = self._dv_prefix + (self._encode_dv(custom_dv) + '\n').encode('utf-8')
+                pkt_cache[poisoned] = pkt
             self._send_bytes(port_out, pkt)
 
-    def _on_recv_dv(self, sender_id, dv_json, port):
+    def _encode_dv(self, dv):
+        """{Dest: Cost} -> DV 负载字符串"""
+        if DV_FORMAT == 'json':
+            return json.dumps({dest: {'cost': cost} for dest, cost in dv.items()})
+        return DV_ENTRY_SEP.join(f"{dest}{DV_COST_SEP}{cost}" for dest, cost in dv.items())
+
+    def _decode_dv(self, payload):
+        """DV 负载字符串 -> {Dest: Cost}，兼容旧版 JSON 格式"""
+        if payload.startswith('{'):
+            dv = {}
+            for dest, info in json.loads(payload).items():
+                cost = info.get('cost', 999) if isinstance(info, dict) else None
+                # 开销必须是整数 (排除 bool / null / 字符串)，否则整包丢弃
+                if type(cost) is not int:
+                    raise ValueError(f"invalid cost for {dest!r}: {cost!r}")
+                dv[_intern(dest)] = cost
+            return dv
+        dv = {}
+        for item in payload.split(DV_ENTRY_SEP):
+            dest, _, cost = item.rpartition(DV_COST_SEP)
+            dv[_intern(dest)] = int(cost)
+        return dv
+
+    def _on_recv_dv(self, sender_id, dv_payload, port):
         """优化的 DV 处理 (Triggered Updates + Poison Reverse Support)"""
-        try: neighbors_dv = json.loads(dv_json)
+        try: neighbors_dv = self._decode_dv(dv_payload)
         except: return
         updated = False
-        with self.rt_lock:
+        with self._rt_write_lock:
+            new_tbl = dict(self.routing_table)
             # 1. Update from neighbor
-            for dst, info in neighbors_dv.items():
+            for dst, cost_neighbor in neighbors_dv.items():
                 if dst == self.my_id: continue
-                cost_neighbor = info.get('cost', 999)
                 new_cost = 1 + cost_neighbor
                 if new_cost > 999: new_cost = 999
                 
-                cur = self.routing_table.get(dst)
+                cur = new_tbl.get(dst)
                 
                 if not cur:
                     if new_cost < 999:
-                        self.routing_table[dst] = {'cost': new_cost, 'next_hop_port': port, 'next_hop_id': sender_id}
+                        self._set_route(new_tbl, dst, {'cost': new_cost, 'next_hop_port': port, 'next_hop_id': sender_id})
                         updated = True
                 
                 elif cur['next_hop_id'] == sender_id:
                     if cur['cost'] != new_cost:
-                        cur['cost'] = new_cost
+                        new_tbl[dst] = dict(cur, cost=new_cost)
                         updated = True
                 
                 elif new_cost < cur['cost']:
-                    self.routing_table[dst] = {'cost': new_cost, 'next_hop_port': port, 'next_hop_id': sender_id}
+                    self._set_route(new_tbl, dst, {'cost': new_cost, 'next_hop_port': port, 'next_hop_id': sender_id})
                     updated = True
 
             # 2. Poison Logic for missing routes from next hop
-            for dst in list(self.routing_table.keys()):
+            for dst in list(self._by_nexthop_id.get(sender_id, ())):
                 if dst == self.my_id: continue
-                route = self.routing_table[dst]
-                if route['next_hop_id'] == sender_id and dst not in neighbors_dv:
+                route = new_tbl[dst]
+                if dst not in neighbors_dv:
                     if route['cost'] != 999:
-                        route['cost'] = 999
+                        new_tbl[dst] = dict(route, cost=999)
                         updated = True
+            
+            if updated:
+                self.routing_table = new_tbl
         
         if updated:
             self._send_dv_updates()
 
     def _task_hello(self):
+        # 端口在 start() 中一次性打开，之后不再增减，(串口, 锁) 列表和 HELLO 包都只需准备一次
+        targets = [(self.active_ports[p], self.port_locks[p]) for p in self.active_ports]
+        packet = self._hello_packet
         while self.running:
-            for p in list(self.active_ports.keys()): self._send_bytes(p, f"{TYPE_HELLO}{SEPARATOR}{self.my_id}")
+            for ser, lock in targets:
+                with lock:
+                    try:
+                        ser.write(packet)
+                    except Exception as e:
+                        Logger.error(f"Send Error on {ser.port}: {e}")
             time.sleep(HELLO_INTERVAL)
 
     def _task_broadcast_dv(self):
@@ -423,33 +569,42 @@ class NetworkNode:
 
     def _task_check_timeout(self):
         while self.running:
-            now = time.time()
+            now = time.monotonic()
             drops = []
             with self.neighbors_lock:
                 for k,v in self.neighbors.items():
                     if now - v['last_seen'] > NEIGHBOR_TIMEOUT: drops.append(k)
                 for k in drops: del self.neighbors[k]
             if drops:
-                with self.rt_lock:
-                    for d,i in self.routing_table.items():
-                        if i['next_hop_port'] in drops and d!=self.my_id: i['cost']=999
+                with self._rt_write_lock:
+                    new_tbl = dict(self.routing_table)
+                    for port in drops:
+                        for d in self._by_nexthop_port.get(port, ()):
+                            if d!=self.my_id: new_tbl[d] = dict(new_tbl[d], cost=999)
+                    self.routing_table = new_tbl
             time.sleep(1)
 
     def _print_table(self):
-        print("\n" + "="*60)
-        print(f"路由表 - MyID: {self.my_id}")
-        print("="*60)
-        print(f"{'Target':<10} {'Cost':<10} {'NextHop':<10} {'Interface':<15}")
-        print("-"*60)
-        with self.rt_lock:
-             # 按Target排序
-            for dest in sorted(self.routing_table.keys()):
-                info = self.routing_table[dest]
-                cost_str = str(info['cost']) if info['cost'] < 999 else "∞"
-                next_hop = info['next_hop_id'] if info.get('next_hop_id') else "-"
-                port = info['next_hop_port']
-                print(f"{dest:<10} {cost_str:<10} {next_hop:<10} {port:<15}")
-        print("="*60 + "\n")
+        # 读取路由表快照后拼成一段文本，一次写出
+        table = self.routing_table
+        lines = [
+            "",
+            "="*60,
+            f"路由表 - MyID: {self.my_id}",
+            "="*60,
+            f"{'Target':<10} {'Cost':<10} {'NextHop':<10} {'Interface':<15}",
+            "-"*60,
+        ]
+        # 按Target排序
+        for dest in sorted(table.keys()):
+            info = table[dest]
+            cost_str = str(info['cost']) if info['cost'] < 999 else "∞"
+            next_hop = info['next_hop_id'] if info.get('next_hop_id') else "-"
+            port = info['next_hop_port']
+            lines.append(f"{dest:<10} {cost_str:<10} {next_hop:<10} {port:<15}")
+        lines.append("="*60 + "\n\n")
+        sys.stdout.write("\n".join(lines))
+        sys.stdout.flush()
 
     def _input_loop(self):
         while self.running:
@@ -468,7 +623,7 @@ class NetworkNode:
                 elif op == 'send': # 简单的不可靠发送示例
                     if len(cmd)<3: print("Usage: send <ID> <Msg>")
                     else:
-                        payload = f"{PROTO_TRANSPORT}{SEPARATOR}{' '.join(cmd[2:])}"
+                        payload = _TRANSPORT_PREFIX + ' '.join(cmd[2:])
                         self._network_send(cmd[1], payload, DEFAULT_TTL)
                 elif op == 'exit':
                     self.running=False
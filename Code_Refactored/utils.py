@@ -1,7 +1,11 @@
 import serial
 import serial.tools.list_ports
 import sys
+import os
 import time
+import queue
+import threading
+import selectors
 
 class Logger:
     """
@@ -29,6 +33,135 @@ class Logger:
         print(f"[WARNING] {msg}")
 
 
+class QueuedLogger:
+    """
+    异步日志工具，接口与 Logger 相同
+    调用方只把消息放入有界队列，由后台线程批量写出，收发线程不必等待控制台输出
+    队列满时直接丢弃消息，保证热路径永不阻塞
+    """
+    def __init__(self, maxsize=512):
+        self._q = queue.Queue(maxsize=maxsize)
+        threading.Thread(target=self._drain, daemon=True).start()
+
+    def _put(self, line):
+        try:
+            self._q.put_nowait(line)
+        except queue.Full:
+            pass
+
+    def info(self, msg):
+        self._put(f"[INFO] {msg}")
+
+    def error(self, msg):
+        self._put(f"[ERROR] {msg}")
+
+    def debug(self, msg):
+        self._put(f"[DEBUG] {msg}")
+
+    def success(self, msg):
+        self._put(f"[SUCCESS] {msg}")
+
+    def warning(self, msg):
+        self._put(f"[WARNING] {msg}")
+
+    def _drain(self):
+        """后台线程：一次取空队列，合并成一次写入"""
+        while True:
+            batch = [self._q.get()]
+            while True:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            sys.stdout.write('\n'.join(batch) + '\n')
+            sys.stdout.flush()
+
+
+class ForwardSummary:
+    """
+    按固定间隔汇总的转发计数器
+    热路径只在锁内累加计数并记下最近一次的参数；后台线程每 interval 秒把非零计数
+    格式化为一条日志，因此流量停止后最后一个窗口的计数也会输出
+    """
+    def __init__(self, log, template, interval=1.0):
+        self._log = log
+        self._template = template  # str.format 模板: {0} 为计数，{1}.. 为最近一次 add() 的参数
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._count = 0
+        self._last = ()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def add(self, *last):
+        with self._lock:
+            self._count += 1
+            self._last = last
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                count, last = self._count, self._last
+                self._count = 0
+            if count:
+                self._log.info(self._template.format(count, *last))
+
+
+def read_commands(prompt="> ", is_running=lambda: True):
+    """
+    逐行读取用户命令的生成器，替代阻塞的 while True: input()
+    POSIX: 将标准输入注册到 selector，空闲时不占用线程，并可定期检查 is_running
+    Windows: select 不支持控制台/管道句柄，改由后台线程读取并经队列投递
+    :param prompt: 每次等待输入前显示的提示符
+    :param is_running: 返回 False 时停止读取
+    :return: 生成去除首尾空白的命令字符串，遇到 EOF 时结束
+    """
+    if sys.platform.startswith('win'):
+        lines = queue.Queue()
+
+        def reader():
+            while True:
+                try:
+                    lines.put(input())
+                except EOFError:
+                    lines.put(None)
+                    return
+
+        threading.Thread(target=reader, daemon=True).start()
+        print(prompt, end="", flush=True)
+        while is_running():
+            try:
+                line = lines.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if line is None:
+                return
+            yield line.strip()
+            print(prompt, end="", flush=True)
+        return
+
+    fd = sys.stdin.fileno()
+    sel = selectors.DefaultSelector()
+    sel.register(fd, selectors.EVENT_READ)
+    pending = b""
+    try:
+        print(prompt, end="", flush=True)
+        while is_running():
+            if not sel.select(timeout=0.5):
+                continue
+            # 直接读文件描述符，避免 sys.stdin 内部缓冲吞掉多行输入后 selector 不再触发
+            data = os.read(fd, 4096)
+            if not data:
+                return
+            pending += data
+            while b"\n" in pending:
+                line, _, pending = pending.partition(b"\n")
+                yield line.decode('utf-8', errors='ignore').strip()
+                print(prompt, end="", flush=True)
+    finally:
+        sel.close()
+
+
 def get_available_ports():
     """
     获取当前可用的串口列表
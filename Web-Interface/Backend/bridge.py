@@ -5,7 +5,9 @@ import json
 import asyncio
 import threading
 import time
+import heapq
 from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the Code directory to sys.path to import Experiment5
 # Assuming this file is in Web-Interface/Backend/
@@ -13,7 +15,30 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')
 # SWITCHED TO EXPERIMENT 5 FOR COMPATIBILITY WITH ORIGINAL CODE
 sys.path.append(os.path.join(PROJECT_ROOT, 'Code', 'Experiment5'))
 
-from reliable_router import ReliableRouterNode
+from reliable_router import ReliableRouterNode, HELLO_INTERVAL, DV_INTERVAL
+
+# comports() can take hundreds of ms on Windows (registry scan), so its result is cached briefly
+PORT_CACHE_TTL = 5.0
+_PORT_CACHE = {'ports': None, 'time': 0.0}
+_PORT_CACHE_LOCK = threading.Lock()
+
+def list_serial_ports():
+    """Return the device names of available serial ports, cached for PORT_CACHE_TTL seconds"""
+    now = time.monotonic()
+    with _PORT_CACHE_LOCK:
+        if _PORT_CACHE['ports'] is not None and now - _PORT_CACHE['time'] < PORT_CACHE_TTL:
+            return list(_PORT_CACHE['ports'])
+    import serial.tools.list_ports
+    ports = [p.device for p in serial.tools.list_ports.comports()]
+    with _PORT_CACHE_LOCK:
+        _PORT_CACHE['ports'] = ports
+        _PORT_CACHE['time'] = time.monotonic()
+    return list(ports)
+
+async def refresh_serial_ports():
+    """Enumerate ports in the default executor so the event loop is not blocked"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, list_serial_ports)
 
 class WebNetworkNode(ReliableRouterNode):
     def __init__(self, log_callback: Callable[[str], None], topo_callback: Callable[[dict], None]):
@@ -25,7 +50,16 @@ class WebNetworkNode(ReliableRouterNode):
         # Setup State
         self.setup_phase = 'ID' # ID -> PORTS -> READY
         self.selected_ports = []
-        self.configured_event = threading.Event()
+        # Awaited by start_async(); set on the owning loop via call_soon_threadsafe
+        self.configured_event = asyncio.Event()
+        self._loop = None
+        # Mirror logs to the local console only when it is a terminal;
+        # under a service manager it is a pipe and each flush is a wasted syscall
+        self._mirror_stdout = bool(sys.__stdout__) and sys.__stdout__.isatty()
+        # Reused worker thread for 'send' instead of one new thread per command.
+        # A single worker: the parent's stop-and-wait shares one seq_num/ack_event,
+        # so sends must run one at a time (queued sends wait their turn)
+        self._send_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='send')
 
     def log(self, *args, **kwargs):
         """Redirects print output to WebSocket"""
@@ -38,21 +72,26 @@ class WebNetworkNode(ReliableRouterNode):
         
         # Also print to local console
         # Use sys.__stdout__ to avoid recursion if we redirected stdout globally (we haven't yet, but good practice)
-        try:
-            sys.__stdout__.write(full_msg + '\n')
-            sys.__stdout__.flush()
-        except:
-            pass
+        if self._mirror_stdout:
+            try:
+                sys.__stdout__.write(full_msg + '\n')
+                sys.__stdout__.flush()
+            except:
+                pass
 
     def start(self):
+        """Blocking entry for callers without an event loop"""
+        asyncio.run(self.start_async())
+
+    async def start_async(self):
         """Non-blocking start method for Web Interface"""
+        self._loop = asyncio.get_running_loop()
         self.log("="*40)
         self.log("Web Bridge for Experiment 5 (Reliable Transport)")
         self.log("="*40)
         
         # Step 1: Detect Ports
-        import serial.tools.list_ports
-        self.available_ports = [p.device for p in serial.tools.list_ports.comports()]
+        self.available_ports = await refresh_serial_ports()
         
         if not self.available_ports:
             self.log("Warning: No Serial Ports Detected!")
@@ -67,9 +106,12 @@ class WebNetworkNode(ReliableRouterNode):
         
         self.setup_phase = 'ID'
         
-        # Wait for configuration to complete
-        self.configured_event.wait()
-        
+        # Wait for configuration to complete (no thread is parked on this)
+        await self.configured_event.wait()
+        self._start_node()
+
+    def _start_node(self):
+        import serial
         # Step 3: Start Node Logic (Copied/Adapted from reliable_router.py start logic)
         self.log(f"Initializing Node {self.my_id} on ports {self.selected_ports}...")
         
@@ -93,13 +135,45 @@ class WebNetworkNode(ReliableRouterNode):
             except Exception as e:
                 self.log(f"[{p}] Failed to open: {e}")
 
-        # Start background tasks
-        threading.Thread(target=self._task_hello, daemon=True).start()
-        threading.Thread(target=self._task_broadcast_dv, daemon=True).start()
-        threading.Thread(target=self._task_check_timeout, daemon=True).start()
+        # Start background tasks (hello / DV / timeout share one timer thread)
+        threading.Thread(target=self._task_periodic, daemon=True).start()
 
         self.log("\n>>> System Ready. Waiting for commands...")
 
+    def stop(self):
+        """Stop the node: background loops exit and queued sends are dropped"""
+        self.running = False
+        self._send_pool.shutdown(wait=False, cancel_futures=True)
+        for ser in self.active_ports.values():
+            try:
+                ser.close()
+            except Exception:
+                pass
+
+    # === Periodic tasks: one thread, min-heap of (next_fire, interval, job) ===
+    # The jobs are the parent's one-shot task bodies (_send_hello_once etc.)
+    def _task_periodic(self):
+        now = time.monotonic()
+        jobs = [
+            (now, HELLO_INTERVAL, self._send_hello_once),
+            (now, DV_INTERVAL, self._broadcast_dv_once),
+            (now + 1, 1, self._check_timeout_once),
+        ]
+        heap = [(t, i, interval, job) for i, (t, interval, job) in enumerate(jobs)]
+        heapq.heapify(heap)
+        while self.running:
+            due, i, interval, job = heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            try:
+                job()
+            except Exception as e:
+                self.log(f"[Timer] {job.__name__} failed: {e}")
+            # Schedule from the previous due time so intervals do not drift
+            heapq.heapreplace(heap, (due + interval, i, interval, job))
+
     def execute_command(self, cmd_str):
         """Handle inputs from the Web Console"""
         cmd_str = cmd_str.strip()
@@ -145,7 +219,11 @@ class WebNetworkNode(ReliableRouterNode):
             self.selected_ports = target_ports
             self.log(f"Selected Ports: {self.selected_ports}")
             self.setup_phase = 'READY'
-            self.configured_event.set() # Unblock start()
+            # Unblock start_async() on its own loop, execute_command may run on another thread
+            if self._loop:
+                self._loop.call_soon_threadsafe(self.configured_event.set)
+            else:
+                self.configured_event.set()
             return
 
         # ==> NORMAL PHASE
@@ -159,7 +237,7 @@ class WebNetworkNode(ReliableRouterNode):
             else:
                 msg = ' '.join(cmd[2:])
                 target = cmd[1]
-                threading.Thread(target=self._initiate_reliable_send, args=(target, msg)).start()
+                self._send_pool.submit(self._initiate_reliable_send, target, msg)
                 
         elif op == 'table':
             # Pretty print routing table
@@ -181,27 +259,99 @@ class WebNetworkNode(ReliableRouterNode):
         elif op == 'ping' or op == 'tracert':
              self.log("Error: 'ping'/'tracert' are Exp6 features. Current mode is Exp5 (Reliable).")
              self.log("Use 'send <ID> <Msg>' instead.")
+        elif op == 'exit' or op == 'quit':
+            self.stop()
+            self.log("Node stopped.")
         elif op == 'help':
-            self.log("Commands: send <ID> <Msg> | table | corrupt on/off")
+            self.log("Commands: send <ID> <Msg> | table | corrupt on/off | exit")
         else:
             self.log(f"Unknown command: {op}")
 
 # We need to redirect stdout to capture inherited methods' prints
 import sys
 import io
+from collections import deque
 
 class StdoutRedirector:
-    def __init__(self, callback):
+    """
+    Mirrors sys.stdout to callback.
+
+    Use install() / uninstall() to swap sys.stdout. When install() is called on a
+    running event loop, printed lines are buffered in a bounded deque (oldest dropped
+    on overflow) and pump() forwards them to callback in coalesced batches. Without
+    a loop, write() calls callback directly, so output is never silently lost.
+    """
+    def __init__(self, callback, maxlen: int = 8192):
         self.callback = callback
         self.old_stdout = sys.stdout
+        self.pending = deque(maxlen=maxlen)
+        self._loop = None
+        self._wakeup = None
+        self._signalled = False  # a wakeup is already scheduled on the loop
+        self._pump_task = None
+
+    def install(self):
+        """Replace sys.stdout; on an event loop also start the batching pump"""
+        sys.stdout = self
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self
+        self._wakeup = asyncio.Event()
+        self._pump_task = loop.create_task(self.pump())
+        self._loop = loop
+        return self
+
+    def uninstall(self):
+        """Restore sys.stdout, stop the pump and flush what is still buffered (call on the loop)"""
+        sys.stdout = self.old_stdout
+        self._loop = None
+        if self._pump_task:
+            self._pump_task.cancel()
+            self._pump_task = None
+        msg = self.drain()
+        if msg:
+            self.callback(msg)
 
     def write(self, text):
         # Filter out newlines to avoid double spacing if log adds one
         if text.strip():
-            self.callback(text.strip())
+            loop = self._loop
+            if loop is None:
+                self.callback(text.strip())
+            else:
+                self.pending.append(text.strip())
+                # One loop wakeup per batch, not per write
+                if not self._signalled:
+                    self._signalled = True
+                    try:
+                        loop.call_soon_threadsafe(self._wakeup.set)
+                    except RuntimeError:
+                        # Loop already closed: deliver directly
+                        self._loop = None
+                        self.callback(self.drain())
         self.old_stdout.write(text)
 
     def flush(self):
         self.old_stdout.flush()
 
+    def drain(self):
+        """Pop everything buffered so far as one message"""
+        lines = []
+        try:
+            while True:
+                lines.append(self.pending.popleft())
+        except IndexError:
+            pass
+        return '\n'.join(lines)
 
+    async def pump(self):
+        """Run on the event loop (started by install()): forward buffered output in batches"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Reset before draining: a line appended after this point schedules a new wakeup
+            self._signalled = False
+            msg = self.drain()
+            if msg:
+                self.callback(msg)
@@ -11,39 +11,110 @@ import os
 from contextlib import asynccontextmanager
 from terminal_session import TerminalSession
 
+# orjson is optional: several times faster than stdlib json, especially for non-ASCII logs
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+    _json_loads = json.loads
+
 # Set paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DIST_DIR = os.path.join(BASE_DIR, '../Frontend/dist')
 
 # Global Node Instance
 terminal_instance = None
-active_websockets = []
+# websocket -> its own bounded send queue, drained by a per-client writer task
+active_websockets = {}
+CLIENT_QUEUE_SIZE = 1024
+LOG_DEDUP_WINDOW = 0.5 # seconds
 loop = None
+log_queue = None
+
+def _enqueue(item):
+    # Called from reader threads: one threadsafe enqueue, the broadcaster task does the sends
+    if loop and loop.is_running() and log_queue is not None:
+        loop.call_soon_threadsafe(log_queue.put_nowait, item)
 
 def broadcast_log(msg: str):
     # print(f"[TERM] {msg}") # Optional server-side logging
-    for websocket in active_websockets:
-        if loop and loop.is_running():
-            asyncio.run_coroutine_threadsafe(
-                websocket.send_json({"type": "log", "data": msg}), 
-                loop
-            )
+    _enqueue(("log", msg))
 
 def broadcast_topo(data: dict):
-    for websocket in active_websockets:
-        if loop and loop.is_running():
-            asyncio.run_coroutine_threadsafe(
-                websocket.send_json({"type": "topo", "data": data}), 
-                loop
-            )
+    _enqueue(("topo", data))
+
+def _fanout(msg_type: str, data):
+    if not active_websockets:
+        return
+    # Encode once, every client gets the same text frame
+    payload = _json_dumps({"type": msg_type, "data": data})
+    # Never await a client here: a slow browser only backs up its own queue
+    for client_queue in list(active_websockets.values()):
+        if client_queue.full():
+            # Drop the oldest frame for this client
+            client_queue.get_nowait()
+        client_queue.put_nowait(payload)
+
+async def _broadcaster():
+    # Identical log lines arriving within LOG_DEDUP_WINDOW of each other are
+    # sent once, followed by a repeat count when the streak ends
+    last_msg = None
+    last_ts = 0.0
+    repeats = 0
+    while True:
+        try:
+            if repeats:
+                item = await asyncio.wait_for(log_queue.get(), LOG_DEDUP_WINDOW)
+            else:
+                item = await log_queue.get()
+        except asyncio.TimeoutError:
+            item = None
+        now = loop.time()
+
+        if item and item[0] == "log" and item[1] == last_msg and now - last_ts < LOG_DEDUP_WINDOW:
+            repeats += 1
+            last_ts = now
+            continue
+        if repeats:
+            _fanout("log", f"(last message repeated ×{repeats})\n")
+            repeats = 0
+        if item is None:
+            last_msg = None
+            continue
+
+        msg_type, data = item
+        # Only whole, non-blank log lines are deduplicated; keystroke echoes never are
+        if msg_type == "log" and data.endswith("\n") and data.strip():
+            last_msg, last_ts = data, now
+        else:
+            last_msg = None
+        _fanout(msg_type, data)
+
+async def _client_writer(websocket: WebSocket, client_queue: asyncio.Queue):
+    try:
+        while True:
+            payload = await client_queue.get()
+            await websocket.send_text(payload)
+    except Exception:
+        # Connection gone; the endpoint's cleanup removes the client
+        pass
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global terminal_instance, loop
+    global terminal_instance, loop, log_queue
     try:
         loop = asyncio.get_running_loop()
     except RuntimeError:
         loop = asyncio.get_event_loop()
+    log_queue = asyncio.Queue()
+    broadcaster_task = asyncio.create_task(_broadcaster())
         
     print(f"Initializing TerminalSession...")
     # Initialize Terminal Session
@@ -56,7 +127,8 @@ async def lifespan(app: FastAPI):
     yield
     
     print("Shutting down...")
-    # Cleanup logic if needed
+    await terminal_instance.close()
+    broadcaster_task.cancel()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -75,12 +147,14 @@ async def health_check():
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    active_websockets.append(websocket)
+    client_queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+    active_websockets[websocket] = client_queue
+    writer_task = asyncio.create_task(_client_writer(websocket, client_queue))
     
     try:
         while True:
             data = await websocket.receive_text()
-            message = json.loads(data)
+            message = _json_loads(data)
             
             if message['type'] == 'command':
                 cmd = message['data']
@@ -88,11 +162,12 @@ async def websocket_endpoint(websocket: WebSocket):
                     terminal_instance.write(cmd)
                     
     except WebSocketDisconnect:
-        active_websockets.remove(websocket)
+        pass
     except Exception as e:
         print(f"WebSocket Error: {e}")
-        if websocket in active_websockets:
-            active_websockets.remove(websocket)
+    finally:
+        active_websockets.pop(websocket, None)
+        writer_task.cancel()
 
 # Serve React App
 # Verify dist directory exists to avoid errors if not built
@@ -122,4 +197,6 @@ if __name__ == "__main__":
             
     print(f"Starting Backend on 0.0.0.0:{port}")
     print("Note: If accessing from another machine, ensure Windows Firewall allows python.exe")
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Frames here are small log lines: use the websockets implementation and
+    # skip per-message deflate, whose overhead exceeds the savings at this size
+    uvicorn.run(app, host="0.0.0.0", port=port, ws="websockets", ws_per_message_deflate=False)
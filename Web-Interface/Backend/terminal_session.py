@@ -1,7 +1,7 @@
 import sys
 import os
-import subprocess
-import threading
+import codecs
+import asyncio
 import time
 import re
 import queue
@@ -11,6 +11,37 @@ import queue
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
 CODE_ROOT = os.path.join(PROJECT_ROOT, 'Code')
 
+# Max bytes taken from the child's stdout per read
+READ_CHUNK_SIZE = 65536
+# How long a partial output line may wait for its remainder (seconds)
+LINE_SETTLE_TIME = 0.005
+
+# Idle interpreters kept ready so a menu selection skips Python startup
+WARM_POOL_SIZE = 1
+
+# Run inside a warm interpreter: preload common modules, then wait for
+# "<script>\t<cwd>" on stdin and run that script as __main__
+_WARM_BOOTSTRAP = """
+import sys, os, runpy, threading, time, json, queue
+try:
+    import serial
+except ImportError:
+    pass
+line = sys.stdin.readline()
+if not line:
+    sys.exit(0)
+script, cwd = line.rstrip('\\n').split('\\t')
+os.chdir(cwd)
+sys.path.insert(0, os.path.dirname(script))
+sys.argv = [script]
+runpy.run_path(script, run_name='__main__')
+"""
+
+# Routing table detection, compiled once
+_TABLE_START = re.compile(r'路由表|Routing Table')
+# Data row: Dest Cost(int) NextHop Interface [...]
+_ROW = re.compile(r'(\S+)\s+(-?\d+)\s+(\S+)\s+(\S+)')
+
 MENU_OPTIONS = {
     '1': {
         'name': 'Experiment 1: Loopback Test',
@@ -54,86 +85,143 @@ MENU_OPTIONS = {
     }
 }
 
+# Launcher menu, joined once at import
+_MENU_STR = "\r\n".join([
+    "\r\n\x1b[1;36m=== Network Experiment Launcher ===\x1b[0m",
+    "Select an experiment to run:",
+    "  [1]  Experiment 1: Loopback Test",
+    "  [2c] Experiment 2: Client",
+    "  [2s] Experiment 2: Server",
+    "  [3r] Experiment 3: Root Node",
+    "  [3l] Experiment 3: Leaf Node",
+    "  [4]  Experiment 4: Router (DV)",
+    "  [5]  Experiment 5: Reliable Router",
+    "  [6]  Experiment 6: Network App",
+    "",
+    "Type the ID (e.g., '4') and press Enter.",
+    "> "
+])
+
 class TerminalSession:
     def __init__(self, log_callback, topo_callback):
         self.log_callback = log_callback
         self.topo_callback = topo_callback
         self.process = None
-        self.thread = None
+        self.monitor_task = None
         self.running = False
-        self.current_buffer = "" # Only for menu
+        self.current_buffer = "" # Partial output line, for table parsing
+        self.input_buffer = "" # Line being typed
+        self._warm_pool = []
+        self._refill_lock = None # asyncio.Lock, created on first refill (needs a running loop)
+        self._tasks = set() # Background tasks; the loop only keeps weak references to them
         
         # Initial greeting
         self.show_menu()
+
+        # Pre-warm interpreters when created on the server's event loop
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            self._spawn(self._refill_pool())
+
+    def _spawn(self, coro):
+        """Schedule a fire-and-forget task and hold a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _refill_pool(self):
+        if self._refill_lock is None:
+            self._refill_lock = asyncio.Lock()
+        # Serialized: two concurrent refills would both see a short pool and over-spawn
+        async with self._refill_lock:
+            # Drop interpreters that died while idle
+            self._warm_pool = [p for p in self._warm_pool if p.returncode is None]
+            while len(self._warm_pool) < WARM_POOL_SIZE:
+                try:
+                    proc = await asyncio.create_subprocess_exec(
+                        sys.executable, '-u', '-c', _WARM_BOOTSTRAP,
+                        stdin=asyncio.subprocess.PIPE,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.STDOUT
+                    )
+                except Exception as e:
+                    self.log_callback(f"\r\n\x1b[1;33mWarm pool refill failed: {e}\x1b[0m\r\n")
+                    return
+                self._warm_pool.append(proc)
+
+    async def close(self):
+        """Stop background tasks and kill idle warm interpreters (called on server shutdown)"""
+        for task in list(self._tasks):
+            task.cancel()
+        pool, self._warm_pool = self._warm_pool, []
+        for proc in pool:
+            if proc.returncode is None:
+                proc.kill()
+        for proc in pool:
+            await proc.wait()
+
+    def _take_warm(self):
+        while self._warm_pool:
+            proc = self._warm_pool.pop()
+            if proc.returncode is None:
+                return proc
+        return None
     
     def show_menu(self):
-        menu = [
-            "\r\n\x1b[1;36m=== Network Experiment Launcher ===\x1b[0m",
-            "Select an experiment to run:",
-            "  [1]  Experiment 1: Loopback Test",
-            "  [2c] Experiment 2: Client",
-            "  [2s] Experiment 2: Server",
-            "  [3r] Experiment 3: Root Node",
-            "  [3l] Experiment 3: Leaf Node",
-            "  [4]  Experiment 4: Router (DV)",
-            "  [5]  Experiment 5: Reliable Router",
-            "  [6]  Experiment 6: Network App",
-            "",
-            "Type the ID (e.g., '4') and press Enter.",
-            "> "
-        ]
-        self.log_callback("\r\n".join(menu))
+        self.log_callback(_MENU_STR)
 
     def write(self, data):
         """Handle input from WebSocket"""
         
-        # Local Echo Logic (Simulate Terminal)
-        # Send back exactly what we got for visual feedback, 
-        # but convert \r to \r\n for display
-        echo_data = data
-        if echo_data == '\r':
-            echo_data = '\r\n'
-        self.log_callback(echo_data)
-        
+        # Line editing happens server-side: keystrokes collect in input_buffer
+        # and only a finished line goes to the menu or the process stdin
+        if data == '\x7f': # Backspace
+            if len(self.input_buffer) > 0:
+                self.input_buffer = self.input_buffer[:-1]
+                # Visual backspace: Move back, Space, Move back
+                self.log_callback("\b \b")
+            return
+
+        # Echo (Simulate Terminal): the browser has no local echo,
+        # convert \r to \r\n for display
+        self.log_callback(data.replace('\r', '\r\n'))
+
+        if '\r' not in data:
+            self.input_buffer += data
+            return
+
+        # One or more lines completed (a paste may contain several)
+        *lines, self.input_buffer = (self.input_buffer + data).split('\r')
+        for line in lines:
+            self._submit_line(line)
+
+    def _submit_line(self, line):
         # If no process is running, we are in menu mode
-        if not self.process or self.process.poll() is not None:
-            # Accumulate buffer for menu selection
-            if data == '\r':
-                cmd = self.current_buffer.strip()
-                self.current_buffer = "" # Reset
-                
-                if cmd in MENU_OPTIONS:
-                    self.launch(MENU_OPTIONS[cmd])
-                else:
-                    if cmd:
-                        self.log_callback(f"Unknown option: {cmd}\r\n> ")
-                    else:
-                        self.log_callback("> ")
-            elif data == '\x7f': # Backspace
-                if len(self.current_buffer) > 0:
-                    self.current_buffer = self.current_buffer[:-1]
-                    # Visual backspace: Move back, Space, Move back
-                    self.log_callback("\b \b") 
+        if not self.process or self.process.returncode is not None:
+            cmd = line.strip()
+            if cmd in MENU_OPTIONS:
+                # write() is called from the event loop; launch runs as a task on it
+                self._spawn(self.launch(MENU_OPTIONS[cmd]))
             else:
-                self.current_buffer += data
-                
+                if cmd:
+                    self.log_callback(f"Unknown option: {cmd}\r\n> ")
+                else:
+                    self.log_callback("> ")
             return
 
-        # If process is running, write to stdin
-        if self.process:
-            try:
-                # Add newline because most inputs expect it
-                # But typical xterm sends \r, need to ensure python gets \n
-                input_data = data
-                if input_data == '\r': 
-                    input_data = '\n'
-                
-                self.process.stdin.write(input_data.encode('utf-8'))
-                self.process.stdin.flush()
-            except IOError:
-                pass
-
-    def launch(self, option):
+        # If process is running, write the whole line to stdin
+        try:
+            # xterm sends \r, python input() expects \n
+            # StreamWriter.write only buffers; the loop flushes it to the pipe
+            self.process.stdin.write((line + '\n').encode('utf-8'))
+        except (IOError, RuntimeError):
+            pass
+
+    async def launch(self, option):
         script_path = option['script']
         cwd = option['cwd']
         name = option['name']
@@ -144,61 +232,89 @@ class TerminalSession:
         cmd = [sys.executable, '-u', script_path]
         
         try:
-            self.process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT, # Merge stderr to stdout
-                cwd=cwd,
-                bufsize=0 # Unbuffered
-            )
+            warm = self._take_warm()
+            if warm:
+                # Hand the script to an already started interpreter
+                warm.stdin.write(f"{script_path}\t{cwd}\n".encode('utf-8'))
+                self.process = warm
+            else:
+                self.process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT, # Merge stderr to stdout
+                    cwd=cwd
+                )
             
             self.running = True
-            self.thread = threading.Thread(target=self._monitor_output, daemon=True)
-            self.thread.start()
+            # Output is read by a task on the event loop, no reader thread needed.
+            # Every session's pipe is multiplexed by the loop's selector, so the
+            # number of reader threads stays at zero however many experiments run.
+            self.monitor_task = asyncio.create_task(self._monitor_output())
+            # Start the next warm interpreter in the background
+            self._spawn(self._refill_pool())
             
         except Exception as e:
             self.log_callback(f"\r\nFailed to start process: {str(e)}\r\n> ")
             self.show_menu()
 
-    def _monitor_output(self):
+    async def _monitor_output(self):
         """Read output from process"""
-        while self.process and self.process.poll() is None:
+        # Incremental decoder keeps multi-byte UTF-8 chars split across reads intact
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        while True:
             try:
-                # Read char by char or line by line?
-                # Line by line is safer for parsing, but char by char is better for interactive feel.
-                # Since we used unbuffered, we can try to read small chunks.
-                chunk = self.process.stdout.read(1)
-                if not chunk:
+                # Take whatever the pipe has (up to READ_CHUNK_SIZE) in one read,
+                # so a burst of output becomes one log frame instead of one per byte
+                chunk = await self.process.stdout.read(READ_CHUNK_SIZE)
+            except OSError:
+                break
+            if not chunk:
+                break
+
+            text = decoder.decode(chunk)
+            if not text:
+                continue
+
+            # print() writes the text and its newline separately; give the rest of
+            # a partial line LINE_SETTLE_TIME to arrive so one frame holds whole lines
+            eof = False
+            while not text.endswith('\n') and len(text) < READ_CHUNK_SIZE:
+                try:
+                    more = await asyncio.wait_for(self.process.stdout.read(READ_CHUNK_SIZE), LINE_SETTLE_TIME)
+                except (asyncio.TimeoutError, OSError):
+                    break
+                if not more:
+                    eof = True
                     break
-                
-                text = chunk.decode('utf-8', errors='ignore')
-                
-                # Send to terminal
-                self.log_callback(text)
-                
-                # Buffer for logical parsing (Looking for Tables)
-                self.current_buffer += text
-                if '\n' in self.current_buffer:
-                    lines = self.current_buffer.split('\n')
-                    # Process complete lines
-                    for line in lines[:-1]:
-                        self._analyze_line(line)
-                    # Keep incomplete line
-                    self.current_buffer = lines[-1]
-                    
-                    # Also analyze accumulated buffer for multi-line tables if needed
-                    # But _analyze_line can trigger a multi-line parser state machine
-                    
-            except Exception as e:
+                text += decoder.decode(more)
+
+            # Send to terminal
+            self.log_callback(text)
+
+            # Buffer for logical parsing (Looking for Tables)
+            self.current_buffer += text
+            if '\n' in self.current_buffer:
+                lines = self.current_buffer.split('\n')
+                # Process complete lines
+                for line in lines[:-1]:
+                    self._analyze_line(line)
+                # Keep incomplete line
+                self.current_buffer = lines[-1]
+
+            if eof:
                 break
-        
+
+        if self.process:
+            await self.process.wait()
         self.log_callback("\r\n\x1b[1;31mProcess exited.\x1b[0m\r\n")
         self.process = None
+        self.input_buffer = ""
         self.show_menu()
 
     # --- Topology Parser State Machine ---
-    _table_buffer = []
+    _partial_entries = {}
+    _my_id = "?"
     _in_table = False
 
     def _analyze_line(self, line):
@@ -210,65 +326,54 @@ class TerminalSession:
         clean_line = line.strip()
         
         # Detect Start
-        if "路由表" in clean_line or "Routing Table" in clean_line:
+        if _TABLE_START.search(clean_line):
             self._in_table = True
-            self._table_buffer = []
+            self._partial_entries = {}
+            self._my_id = "?"
             return
 
-        # Detect End (Empty line or separator line after content if we want strictness, 
-        # but usually the next prompt or ----------- marks end)
-        # For simplicity, if we are in table, we collect until we see a separator line at the end, 
-        # OR we just parse on every line addition if we match the format.
-        
-        if self._in_table:
-            self._table_buffer.append(clean_line)
-            # If we see a separator line that might be the footer?
-            # Or if it's the header separator.
-            
-            # Let's try to parse the buffer if it looks substantial
-            if len(self._table_buffer) > 2:
-                self._parse_table_buffer(self._table_buffer)
-            
-            # Reset if we hit an empty line or end separator
-            if clean_line.startswith('---') and len(self._table_buffer) > 1:
-                # Could be footer
-                pass
+        if not self._in_table:
+            return
+
+        # Detect End: an empty line or a separator once rows have been collected.
+        # Separators before the first row are the header underline, skip them.
+        if not clean_line or clean_line.startswith(('---', '===')):
+            if self._partial_entries:
+                self._finish_table()
+            return
+
+        # Each row is parsed once as it arrives
+        self._parse_table_row(clean_line)
 
-    def _parse_table_buffer(self, lines):
+    def _parse_table_row(self, line):
         # Experiment 4 Format:
         # Destination     Cost       Next Hop        Interface
         # A               0          A               LOCAL
         
-        # We need to find the data rows.
-        # Ignore headers and separators.
-        
-        parsed_entries = {}
-        my_id = "?"
-        
-        for l in lines:
-            parts = l.split()
-            if len(parts) >= 4:
-                # Check if it looks like a data row: Dest(Str) Cost(Int) NextHop(Str) Interface(Str)
-                dest, cost_str, next_hop, interface = parts[0], parts[1], parts[2], parts[3]
-                
-                if next_hop.upper() == "NEXT": continue # Header row
-                
-                try:
-                    cost = int(cost_str)
-                    parsed_entries[dest] = {
-                        'cost': cost,
-                        'next_hop': next_hop,
-                        'interface': interface
-                    }
-                    if cost == 0:
-                        my_id = dest
-                except ValueError:
-                    continue
-
-        if parsed_entries and my_id != "?":
+        # Cheap guard before the regex: a data row has at least 4 columns
+        if len(line) < 7:
+            return
+        # Header rows fail here since their Cost column is not a number
+        m = _ROW.match(line)
+        if not m:
+            return
+        dest, cost_str, next_hop, interface = m.groups()
+        cost = int(cost_str)
+        self._partial_entries[dest] = {
+            'cost': cost,
+            'next_hop': next_hop,
+            'interface': interface
+        }
+        if cost == 0:
+            self._my_id = dest
+
+    def _finish_table(self):
+        self._in_table = False
+        if self._partial_entries and self._my_id != "?":
             # Send topology update
             topo_data = {
-                'id': my_id,
-                'table': parsed_entries
+                'id': self._my_id,
+                'table': self._partial_entries
             }
             self.topo_callback(topo_data)
+        self._partial_entries = {}